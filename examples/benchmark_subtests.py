@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+subTest 性能基准
+
+运行包含大量 subTest 的用例，统计每个 subTest 的平均耗时。
+耗时随 subTest 数量线性增长（平均耗时基本不变）说明结果收集是 O(n) 的。
+
+用法: python benchmark_subtests.py [最大 subTest 数量]
+"""
+
+import io
+import os
+import sys
+import time
+import unittest
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from htmltestrunner.runner import _TestResult
+
+
+def make_suite(subtests, per_test=10):
+    """ 生成共 subtests 个通过的 subTest，每个用例 per_test 个 """
+    tests = subtests // per_test
+
+    class ParametrizedTest(unittest.TestCase):
+        pass
+
+    def test(self):
+        for i in range(per_test):
+            with self.subTest(i=i):
+                pass
+
+    for n in range(tests):
+        setattr(ParametrizedTest, 'test_%d' % n, test)
+    return unittest.TestLoader().loadTestsFromTestCase(ParametrizedTest)
+
+
+def bench(subtests):
+    suite = make_suite(subtests)
+    result = _TestResult(verbosity=1)
+    stderr, sys.stderr = sys.stderr, io.StringIO()
+    try:
+        start = time.perf_counter()
+        suite(result)
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.stderr = stderr
+    assert result.success_count == subtests
+    return elapsed
+
+
+if __name__ == '__main__':
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    size = largest // 8
+    print('%10s %12s %16s' % ('subtests', 'total (s)', 'per subtest (us)'))
+    while size <= largest:
+        elapsed = bench(size)
+        print('%10d %12.3f %16.2f' % (size, elapsed, elapsed / size * 1e6))
+        size *= 2
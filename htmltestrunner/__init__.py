@@ -3,8 +3,8 @@
 HTMLTestRunner PY3 - 现代化的 Python 测试报告生成器
 """
 
-from .runner import HTMLTestRunner
+from .runner import HTMLTestRunner, run_concurrently
 
 __version__ = "1.0.3"
 __author__ = "Lit"
-__all__ = ["HTMLTestRunner"]
+__all__ = ["HTMLTestRunner", "run_concurrently"]
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Vendor assets (Bootstrap, Bootstrap Icons, ECharts) for self-contained reports.
+
+HTMLTestRunner(inline_assets=True) embeds these files into the report instead
+of linking to the CDN, so the report opens offline. The files are shipped as
+package data in ``htmltestrunner/static``, along with their licenses; that
+directory is populated (when updating the pinned versions) with
+
+    python -m htmltestrunner.assets
+
+which downloads the exact versions the CDN links in the template point to.
+"""
+
+import base64
+import functools
+import io
+import os
+import re
+import sys
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+CDN = 'https://cdn.jsdelivr.net/npm/'
+
+# file name in STATIC_DIR -> source URL
+ASSETS = {
+    'bootstrap.min.css': CDN + 'bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap.bundle.min.js': CDN + 'bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'bootstrap-icons.min.css': CDN + 'bootstrap-icons@1.11.0/font/bootstrap-icons.min.css',
+    'bootstrap-icons.woff2': CDN + 'bootstrap-icons@1.11.0/font/fonts/bootstrap-icons.woff2',
+    'echarts.min.js': CDN + 'echarts@5.4.3/dist/echarts.min.js',
+    'LICENSE.bootstrap': CDN + 'bootstrap@5.3.0/LICENSE',
+    'LICENSE.bootstrap-icons': CDN + 'bootstrap-icons@1.11.0/LICENSE',
+    'LICENSE.echarts': CDN + 'echarts@5.4.3/LICENSE',
+}
+
+INLINE_TMPL = u"""
+    <style type="text/css">%(bootstrap_css)s</style>
+    <style type="text/css">%(icons_css)s</style>
+    <script type="text/javascript">%(echarts_js)s</script>
+    <script type="text/javascript">%(bootstrap_js)s</script>
+"""  # variables: (bootstrap_css, icons_css, echarts_js, bootstrap_js)
+
+_ICON_RULE = re.compile(r'\.bi-([a-z0-9-]+)::?before\s*\{\s*content:\s*"[^"]*"\s*;?\s*\}')
+_FONT_SRC = re.compile(r'src:\s*url\([^;}]*')
+
+
+@functools.lru_cache(maxsize=None)
+def load(name):
+    """ Return the content of a static asset; read once per process """
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.isfile(path):
+        raise IOError('missing report asset %s: the package was built without its vendor files; '
+                      'run "python -m htmltestrunner.assets" to download them' % path)
+    if name.endswith('.woff2'):
+        with open(path, 'rb') as f:
+            return f.read()
+    with io.open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def icons_css(used=None):
+    """
+    Bootstrap Icons stylesheet with the icon font embedded as a data URI.
+    With ``used`` (a set of icon names, without the ``bi-`` prefix) the
+    stylesheet is tree-shaken to the rules of those icons.
+    """
+    font = base64.b64encode(load('bootstrap-icons.woff2')).decode('ascii')
+    css = _FONT_SRC.sub('src: url("data:font/woff2;base64,%s") format("woff2")' % font,
+                        load('bootstrap-icons.min.css'), count=1)
+    if used is not None:
+        css = _ICON_RULE.sub(lambda m: m.group(0) if m.group(1) in used else '', css)
+    return css
+
+
+def _script(js):
+    # a literal "</script" inside the code would end the element early
+    return js.replace('</script', '<\\/script')
+
+
+@functools.lru_cache(maxsize=None)
+def inline_block(used_icons=None):
+    """
+    Return the <style>/<script> block replacing the CDN links of the report
+    head. ``used_icons`` is a frozenset of icon names to tree-shake to.
+    """
+    return INLINE_TMPL % dict(
+        bootstrap_css = load('bootstrap.min.css'),
+        icons_css = icons_css(used_icons),
+        echarts_js = _script(load('echarts.min.js')),
+        bootstrap_js = _script(load('bootstrap.bundle.min.js')),
+    )
+
+
+def download(dest=STATIC_DIR):
+    """
+    Download the vendor assets into ``dest``. Every file is fetched before
+    any is written, so a failed download leaves ``dest`` as it was rather
+    than with a partial set of files to package.
+    """
+    from urllib.request import urlopen
+
+    contents = {}
+    for name, url in sorted(ASSETS.items()):
+        print('%s <- %s' % (name, url), file=sys.stderr)
+        with urlopen(url) as response:
+            contents[name] = response.read()
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+    for name, content in contents.items():
+        path = os.path.join(dest, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    try:
+        download(sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR)
+    except (IOError, OSError) as e:
+        sys.exit('cannot download the report assets: %s' % e)
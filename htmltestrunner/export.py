@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Machine readable exports of the test results: JSONL and JUnit XML.
+
+The writers are _TestResult listeners: add_record() is called with every
+(result code, test, output, stack trace, stats) record as soon as it is
+appended to the result, and close() once the run is over.
+"""
+
+import io
+import json
+import re
+from unittest.suite import _ErrorHolder
+from xml.sax.saxutils import XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
+
+OUTCOMES = {
+    0: 'pass',
+    1: 'fail',
+    2: 'error',
+    3: 'skip',
+}
+
+
+def test_record(item):
+    """ Return a JSON serializable dict describing one result record """
+    n, t, o, e, stats = item
+    cls = t.__class__
+    record = {
+        'id': t.id(),
+        'class': '%s.%s' % (cls.__module__, cls.__name__),
+        'description': t.shortDescription() or '',
+        'status': n,
+        'outcome': OUTCOMES[n],
+        'output': o,
+        'traceback': e,
+    }
+    record.update(stats)
+    return record
+
+
+class JSONLWriter(object):
+    """
+    Write one JSON line per test record. Each line is flushed right away so
+    the file can be tailed while the run is in progress and parsed line by
+    line in constant memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fp = io.open(path, 'w', encoding='utf-8')
+
+    def add_record(self, item):
+        self.fp.write(json.dumps(test_record(item), ensure_ascii=False, default=str))
+        self.fp.write(u'\n')
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+
+def read_durations(path):
+    """ Return {test id: seconds} from a JSONL results file, subtests summed """
+    durations = {}
+    with io.open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                durations[record['id']] = durations.get(record['id'], 0.0) + record.get('wall', 0.0)
+    return durations
+
+
+# characters XML 1.0 does not allow, even escaped
+_INVALID_XML_CHARS = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _xml_text(s):
+    return _INVALID_XML_CHARS.sub(u'\ufffd', s)
+
+
+# description unittest gives the _ErrorHolder of a failing fixture, e.g.
+# 'setUpClass (package.module.Class)'
+_FIXTURE_DESCRIPTION = re.compile(r'^(\w+) \((.+)\)$')
+
+
+def _junit_names(test):
+    """ Return (classname, name) of a record's test """
+    if isinstance(test, _ErrorHolder):
+        m = _FIXTURE_DESCRIPTION.match(test.description)
+        if m:
+            return m.group(2), m.group(1)
+        return test.description, test.description
+    cls = test.__class__
+    return '%s.%s' % (cls.__module__, cls.__name__), test.id().split('.')[-1]
+
+
+class JUnitXMLWriter(object):
+    """
+    Write the results as JUnit XML, one <testsuite> per test class.
+
+    The document is streamed with a SAX XMLGenerator: records are collected
+    until a record of another class arrives, then that class's <testsuite>
+    is written and its records dropped, so only one class is held in
+    memory. As with the streaming HTML report, a class whose tests are not
+    contiguous produces more than one <testsuite>.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fp = io.open(path, 'w', encoding='utf-8')
+        self.xml = XMLGenerator(self.fp, encoding='utf-8', short_empty_elements=True)
+        self.xml.startDocument()
+        self.xml.startElement('testsuites', AttributesImpl({}))
+        self.cls = None
+        self.records = []
+
+    def add_record(self, item):
+        cls = _junit_names(item[1])[0]
+        if cls != self.cls:
+            self.flush()
+            self.cls = cls
+        self.records.append(item)
+
+    def flush(self):
+        if not self.records:
+            return
+        cases = self._testcases()
+        counts = [0, 0, 0, 0]
+        for case in cases:
+            counts[case[2]] += 1
+        self.xml.startElement('testsuite', AttributesImpl({
+            'name': self.cls,
+            'tests': str(len(cases)),
+            'failures': str(counts[1]),
+            'errors': str(counts[2]),
+            'skipped': str(counts[3]),
+            'time': '%.3f' % sum(case[3] for case in cases),
+        }))
+        for case in cases:
+            self._write_testcase(*case)
+        self.xml.endElement('testsuite')
+        self.xml.ignorableWhitespace('\n')
+        self.fp.flush()
+        self.records = []
+
+    def _testcases(self):
+        """
+        Return the [classname, name, result code, time, output, stack trace]
+        testcases of the held records. Like history.test_totals, passing
+        subtests fold into their test, so tests= counts tests; failing
+        subtests are testcases of their own, named after the subtest.
+        """
+        cases = []
+        folded = {}     # test id -> the testcase passing subtests fold into
+        for n, t, o, e, stats in self.records:
+            classname, name = _junit_names(t)
+            subtest = stats.get('subtest')
+            if subtest is not None and n != 0:
+                cases.append([classname, subtest, n, stats['wall'], o, e])
+                continue
+            case = folded.get(t.id())
+            if case is None:
+                case = folded[t.id()] = [classname, name, n, 0.0, '', e]
+                cases.append(case)
+            elif subtest is None:
+                # the test's own record replaces the passing subtests' one
+                case[2], case[5] = n, e
+            case[3] += stats['wall']
+            case[4] += o
+        return cases
+
+    def _write_testcase(self, classname, name, n, time, o, e):
+        xml = self.xml
+        xml.startElement('testcase', AttributesImpl({
+            'classname': classname,
+            'name': name,
+            'time': '%.3f' % time,
+        }))
+        if n in (1, 2):
+            lines = e.strip().splitlines()
+            xml.startElement('failure' if n == 1 else 'error', AttributesImpl({
+                'message': _xml_text(lines[-1] if lines else ''),
+            }))
+            xml.characters(_xml_text(e))
+            xml.endElement('failure' if n == 1 else 'error')
+        elif n == 3:
+            xml.startElement('skipped', AttributesImpl({'message': _xml_text(e)}))
+            xml.endElement('skipped')
+        if o:
+            xml.startElement('system-out', AttributesImpl({}))
+            xml.characters(_xml_text(o))
+            xml.endElement('system-out')
+        xml.endElement('testcase')
+
+    def close(self):
+        self.flush()
+        self.xml.endElement('testsuites')
+        self.xml.endDocument()
+        self.fp.close()
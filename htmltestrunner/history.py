@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent per-test history of status and duration across runs.
+
+HTMLTestRunner(history_file='report.history.db') appends every run to a
+SQLite database, which later runs use to order parallel work and
+flag tests that became slower (see find_regressions).
+"""
+
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    duration REAL NOT NULL,
+    title TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    test_id TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    wall REAL NOT NULL,
+    cpu REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_test_run ON results (test_id, run_id);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+# status of a test from the status of its records (subtests): the first of
+# error, fail, pass, skip present
+_SEVERITY = (2, 1, 0, 3)
+
+
+def test_totals(records):
+    """
+    Fold result records into {test id: (status, wall, cpu)}: the records of
+    one test (its subtests) are summed up, the status is the most severe.
+    """
+    tests = {}
+    for n, t, o, e, stats in records:
+        row = tests.setdefault(t.id(), [set(), 0.0, 0.0])
+        row[0].add(n)
+        row[1] += stats['wall']
+        row[2] += stats['cpu']
+    return dict((test_id, (next(n for n in _SEVERITY if n in codes), wall, cpu))
+                for test_id, (codes, wall, cpu) in tests.items())
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+class HistoryStore(object):
+    """ SQLite store of per-test status and duration, one row per test and run """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_run(self, started, duration, records, title=None):
+        """
+        Store a run: ``records`` are (result code, test, output, stack
+        trace, stats) result tuples; the records of one test (its subtests)
+        are summed up into a single row. Return the run id.
+        """
+        with self.conn:
+            cursor = self.conn.execute('INSERT INTO runs (started, duration, title) VALUES (?, ?, ?)',
+                                       (started, duration, title))
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                'INSERT INTO results (run_id, test_id, status, wall, cpu) VALUES (?, ?, ?, ?, ?)',
+                ((run_id, test_id, status, wall, cpu)
+                 for test_id, (status, wall, cpu) in test_totals(records).items()))
+        return run_id
+
+    def run_ids(self, last=None):
+        """ Ids of the stored runs, newest first """
+        sql = 'SELECT id FROM runs ORDER BY id DESC'
+        if last:
+            sql += ' LIMIT %d' % int(last)
+        return [row[0] for row in self.conn.execute(sql)]
+
+    def history(self, test_id, last=None):
+        """ [(run id, status, wall, cpu)] of one test, newest first """
+        sql = 'SELECT run_id, status, wall, cpu FROM results WHERE test_id = ? ORDER BY run_id DESC'
+        if last:
+            sql += ' LIMIT %d' % int(last)
+        return self.conn.execute(sql, (test_id,)).fetchall()
+
+    def durations(self, last=5, before=None):
+        """ Return {test id: median wall seconds} of samples() """
+        return dict((test_id, _median(walls)) for test_id, walls in self.samples(last, before).items())
+
+    def samples(self, last=5, before=None):
+        """
+        Return {test id: [wall seconds]} of the ``last`` stored runs of each
+        test (older than run ``before`` if given), counting only runs in
+        which the test passed or failed; errors and skips say nothing about
+        its speed. Runs without the test, such as runs of a single module,
+        do not push its samples out.
+        """
+        where = 'status IN (0, 1)'
+        args = ()
+        if before is not None:
+            where += ' AND run_id < ?'
+            args = (before,)
+        rows = self.conn.execute(
+            'SELECT test_id, wall FROM ('
+            ' SELECT test_id, wall, ROW_NUMBER() OVER (PARTITION BY test_id ORDER BY run_id DESC) AS k'
+            ' FROM results WHERE %s) WHERE k <= ?' % where, args + (last,))
+        samples = {}
+        for test_id, wall in rows:
+            samples.setdefault(test_id, []).append(wall)
+        return samples
+
+
+def find_regressions(samples, current, ratio=1.5, min_delta=0.1, threshold=3.0, min_runs=3):
+    """
+    Compare the current wall time of each test ({test id: seconds}) with its
+    baseline samples ({test id: [seconds]}, see HistoryStore.samples).
+
+    A test is flagged when it is at least ``ratio`` times and ``min_delta``
+    seconds slower than the baseline median, and the slowdown exceeds
+    ``threshold`` robust standard deviations (1.4826 * median absolute
+    deviation) of the baseline. Tests with fewer than ``min_runs`` samples
+    are not judged. Return dicts (test_id, baseline, current, ratio, runs),
+    largest slowdown first.
+    """
+    regressions = []
+    for test_id, wall in current.items():
+        walls = samples.get(test_id)
+        if not walls or len(walls) < min_runs:
+            continue
+        baseline = _median(walls)
+        delta = wall - baseline
+        if delta < min_delta or wall < baseline * ratio:
+            continue
+        spread = 1.4826 * _median([abs(w - baseline) for w in walls])
+        if spread and delta < threshold * spread:
+            continue
+        regressions.append(dict(
+            test_id = test_id,
+            baseline = baseline,
+            current = wall,
+            ratio = wall / baseline if baseline else float('inf'),
+            runs = len(walls),
+        ))
+    regressions.sort(key=lambda r: (r['ratio'], r['current']), reverse=True)
+    return regressions
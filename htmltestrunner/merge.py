@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Merge the JSONL results of several runs (e.g. CI shards) into one HTML report.
+
+    python -m htmltestrunner.merge -o report.html shard-*.jsonl
+
+The inputs are the files written with HTMLTestRunner(jsonl_file=...). They
+are read line by line and only an index of the records is kept: captured
+output and stack traces are read back from the files one class at a time
+while the report is streamed out.
+"""
+
+import argparse
+import datetime
+import io
+import json
+import sys
+
+from .runner import HTMLTestRunner, _StreamingReport, _TestResult
+
+# record fields that are not part of the stats dict
+_RECORD_FIELDS = ('id', 'class', 'description', 'status', 'outcome', 'output', 'traceback')
+
+
+class RecordedTest(object):
+    """ Stand-in for the TestCase of a record read back from a JSONL file """
+
+    __slots__ = ('_id', '_description', 'source', 'offset')
+
+    def __init__(self, test_id, description, source, offset):
+        self._id = test_id
+        self._description = description
+        self.source = source
+        self.offset = offset
+
+    def id(self):
+        return self._id
+
+    def shortDescription(self):
+        return self._description or None
+
+    def __str__(self):
+        return self._id
+
+
+_classes = {}
+
+
+def _recorded_class(name):
+    """ Return a RecordedTest subclass named after a recorded test class """
+    if name not in _classes:
+        module, _, cls_name = name.rpartition('.')
+        _classes[name] = type(cls_name, (RecordedTest,), {'__module__': module, '__slots__': ()})
+    return _classes[name]
+
+
+def read_index(paths, result):
+    """
+    Append a record without output and stack trace to ``result`` for every
+    line of the JSONL files; the test stand-in remembers where to find them.
+    Return the summed test time of every file.
+    """
+    totals = []
+    for source, path in enumerate(paths):
+        total = 0.0
+        with io.open(path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                record = json.loads(line.decode('utf-8'))
+                n = record['status']
+                test = _recorded_class(record['class'])(record['id'], record['description'], source, offset)
+                stats = dict((k, v) for k, v in record.items() if k not in _RECORD_FIELDS)
+                total += stats.get('wall', 0.0)
+                if n == 0: result.success_count += 1
+                elif n == 1: result.failure_count += 1
+                elif n == 2: result.error_count += 1
+                else: result.skip_count += 1
+                result.result.append((n, test, '', '', stats))
+        totals.append(total)
+    return totals
+
+
+class MergedReportRunner(HTMLTestRunner):
+    """ HTMLTestRunner that renders records read back by read_index() """
+
+    def __init__(self, paths, **kwargs):
+        HTMLTestRunner.__init__(self, **kwargs)
+        self.sources = [io.open(path, 'rb') for path in paths]
+
+    def _generate_report_class(self, rows, cid, cls, cls_results, fixtures=None):
+        # load output and stack traces of this class only
+        loaded = []
+        for n, t, o, e, stats in cls_results:
+            f = self.sources[t.source]
+            f.seek(t.offset)
+            record = json.loads(f.readline().decode('utf-8'))
+            loaded.append((n, t, record['output'], record['traceback'], stats))
+        return HTMLTestRunner._generate_report_class(self, rows, cid, cls, loaded, fixtures)
+
+    def close(self):
+        for f in self.sources:
+            f.close()
+
+
+def merge_results(paths, stream, **kwargs):
+    """
+    Write one HTML report for the JSONL result files ``paths`` to ``stream``.
+    Keyword arguments are passed to HTMLTestRunner (title, description,
+    report_mode, ...). Return the merged result.
+    """
+    result = _TestResult(verbosity=0)
+    totals = read_index(paths, result)
+    runner = MergedReportRunner(paths, stream=stream, **kwargs)
+    # the shards ran side by side: the slowest one determines the duration
+    runner.stopTime = runner.startTime + datetime.timedelta(seconds=max(totals or [0]))
+    writer = _StreamingReport(runner, result)
+    try:
+        writer.begin()
+        for cls, cls_results in runner.sortResult(result.result):
+            for item in cls_results:
+                writer.add_record(item)
+        writer.end(result)
+    finally:
+        runner.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m htmltestrunner.merge',
+                                     description='Merge JSONL test results into one HTML report.')
+    parser.add_argument('files', nargs='+', help='JSONL result files (HTMLTestRunner jsonl_file)')
+    parser.add_argument('-o', '--output', required=True, help='HTML report to write')
+    parser.add_argument('--title', help='report title')
+    parser.add_argument('--description', help='report description')
+    parser.add_argument('--tester', help='tester shown in the report')
+    parser.add_argument('--report-mode', default='html', choices=HTMLTestRunner.REPORT_MODES)
+    args = parser.parse_args(argv)
+    with open(args.output, 'wb') as f:
+        result = merge_results(args.files, f, title=args.title, description=args.description,
+                               tester=args.tester, report_mode=args.report_mode)
+    print('%d results from %d files merged into %s' % (len(result.result), len(args.files), args.output),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
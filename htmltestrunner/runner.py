@@ -20,15 +20,42 @@ Version 1.0.0
 # TODO: color stderr
 # TODO: simplify javascript using ,ore than 1 class in the class attribute?
 
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import cProfile
 import datetime
+import heapq
+import inspect
+import json
+import marshal
+import multiprocessing
+import pstats
 import sys
 import io
 import os
+import threading
 import time
+import tracemalloc
+import re
 import webbrowser
 import unittest
+from unittest.case import _Outcome, _SubTest, _subtest_msg_sentinel
+from unittest.suite import _ErrorHolder
+from unittest.util import strclass
 from xml.sax import saxutils
 
+from . import assets
+from .export import JSONLWriter, JUnitXMLWriter, read_durations
+from .history import HistoryStore, find_regressions, test_totals
+
+# like unittest's own modules, keep the runner's frames (e.g. the fixture
+# timing wrappers) out of the reported stack traces
+__unittest = True
+
 
 # ------------------------------------------------------------------------
 # The redirectors below are used to capture output during testing. Output
@@ -40,25 +67,191 @@ from xml.sax import saxutils
 # e.g.
 #   >>> logging.basicConfig(stream=HTMLTestRunner.stdout_redirector)
 #   >>>
+#
+# HTMLTestRunner installs the redirectors as sys.stdout and sys.stderr once
+# for the whole run. The capture target is a context variable holding the
+# _Capture of a _TestResult, i.e. the buffer of the test it is running, so
+# tests running concurrently in threads (thread_workers) or asyncio tasks
+# each write to their own buffer without any locking. The target is also
+# kept per thread for code running in a context copied before the test
+# started (e.g. the event loop of an IsolatedAsyncioTestCase). Threads
+# started by a test inherit the _Capture (see redirected_output): once that
+# test is over they write to the next test of the same result. Output
+# outside of tests goes to fp.
+
+class _Capture(object):
+    """ The buffer of the test a _TestResult is running, None between tests """
+
+    __slots__ = ('buffer',)
+
+    def __init__(self):
+        self.buffer = None
+
 
 class OutputRedirector(object):
     """ Wrapper to redirect stdout or stderr """
     def __init__(self, fp):
         self.fp = fp
+        self.context = contextvars.ContextVar('capture', default=None)
+        self.local = threading.local()
+
+    def capture(self, capture, context=None):
+        """
+        Redirect the output of the current context and thread to the
+        _Capture ``capture`` (None: back to fp), and that of ``context`` if
+        given.
+        """
+        self.context.set(capture)
+        self.local.capture = capture
+        if context is not None:
+            context.run(self.context.set, capture)
+
+    def capturing(self):
+        """ The _Capture of the current context and thread, or None """
+        capture = self.context.get()
+        if capture is None:
+            capture = getattr(self.local, 'capture', None)
+        return capture
+
+    def captured(self):
+        """ The buffer output of the current context and thread goes to, or None """
+        capture = self.capturing()
+        return capture.buffer if capture is not None else None
+
+    def target(self):
+        fp = self.captured()
+        if fp is None:
+            return self.fp
+        return fp
 
     def write(self, s):
-        self.fp.write(s)
+        self.target().write(s)
 
     def writelines(self, lines):
-        self.fp.writelines(lines)
+        self.target().writelines(lines)
 
     def flush(self):
-        self.fp.flush()
+        self.target().flush()
 
 stdout_redirector = OutputRedirector(sys.stdout)
 stderr_redirector = OutputRedirector(sys.stderr)
 
 
+@contextlib.contextmanager
+def redirected_output():
+    """
+    Install the redirectors as sys.stdout and sys.stderr for the duration,
+    sending output outside of tests to the streams they replace. Does
+    nothing if they are installed already.
+
+    Threads do not inherit context variables, so threading.Thread.start is
+    wrapped as well: a thread started during a test captures its output
+    like the code of the test, into the buffer of the test the same
+    _TestResult is running at the time of the write.
+    """
+    if sys.stdout is stdout_redirector:
+        yield
+        return
+    streams = [(name, getattr(sys, name), redirector, redirector.fp)
+               for name, redirector in (('stdout', stdout_redirector), ('stderr', stderr_redirector))]
+    for name, stream, redirector, fp in streams:
+        if stream is not redirector:
+            redirector.fp = stream
+        setattr(sys, name, redirector)
+    start = threading.Thread.start
+
+    def start_captured(thread):
+        captures = [(redirector, redirector.capturing()) for redirector in (stdout_redirector, stderr_redirector)]
+        if any(capture is not None for redirector, capture in captures):
+            run = thread.run
+
+            def run_captured():
+                for redirector, capture in captures:
+                    redirector.capture(capture)
+                run()
+            thread.run = run_captured
+        start(thread)
+
+    threading.Thread.start = start_captured
+    try:
+        yield
+    finally:
+        threading.Thread.start = start
+        for name, stream, redirector, fp in streams:
+            setattr(sys, name, stream)
+            redirector.fp = fp
+
+
+class BoundedOutputBuffer(object):
+    """
+    Output buffer of one test that retains at most ``limit`` characters:
+    the first limit/2 and, in a ring buffer of written chunks, the last
+    limit/2. What lies in between is replaced by a marker in getvalue().
+
+    With ``spill_path`` the complete output of a test that overflows the
+    limit is written to that file, so the report can link to it instead of
+    inlining it. The file is only created once the limit is exceeded.
+    """
+
+    TRUNCATED_TMPL = u'\n...... 已省略 %d 个字符 ......\n'
+
+    def __init__(self, limit, spill_path=None):
+        self.limit = limit
+        self.head_size = limit // 2
+        self.tail_size = limit - self.head_size
+        self.head = io.StringIO()
+        self.head_len = 0
+        self.tail = collections.deque()
+        self.tail_len = 0
+        self.total = 0
+        self.spill_path = spill_path
+        self.spill = None
+
+    @property
+    def spilled(self):
+        return self.spill is not None
+
+    def write(self, s):
+        self.total += len(s)
+        if self.spill:
+            self.spill.write(s)
+        room = self.head_size - self.head_len
+        if room > 0:
+            self.head.write(s[:room])
+            self.head_len += min(room, len(s))
+            s = s[room:]
+            if not s:
+                return
+        if self.spill_path and not self.spill and self.total > self.limit:
+            self.spill = io.open(self.spill_path, 'w', encoding='utf-8')
+            self.spill.write(self.head.getvalue())
+            self.spill.writelines(self.tail)
+            self.spill.write(s)
+        self.tail.append(s)
+        self.tail_len += len(s)
+        while self.tail_len - len(self.tail[0]) >= self.tail_size:
+            self.tail_len -= len(self.tail.popleft())
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self.spill:
+            self.spill.flush()
+
+    def close(self):
+        if self.spill:
+            self.spill.close()
+
+    def getvalue(self):
+        tail = ''.join(self.tail)
+        if self.total <= self.limit:
+            return self.head.getvalue() + tail
+        return (self.head.getvalue() + self.TRUNCATED_TMPL % (self.total - self.limit) +
+                tail[-self.tail_size:])
+
+
 # ----------------------------------------------------------------------
 # Template
 
@@ -110,6 +303,42 @@ class Template_mixin(object):
         3: u'跳过',
     }
 
+    # html: every test row and its popup are rendered into the page
+    # json: test rows are rendered in the browser from per-class JSON data
+    # virtual: like json, but the table only materializes the visible rows
+    REPORT_MODES = ('html', 'json', 'virtual')
+
+    # slow test detection against the history store: the baseline is the
+    # median of the last runs, see history.find_regressions
+    REGRESSION_BASELINE_RUNS = 5
+    REGRESSION_RATIO = 1.5
+    REGRESSION_MIN_DELTA = 0.1
+
+    # size of the slowest tests / classes tables
+    SLOWEST_COUNT = 25
+
+    # upper bounds (seconds) of the log scale duration histogram buckets
+    HISTOGRAM_BOUNDS = (0.001, 0.01, 0.1, 1, 10, 100)
+    HISTOGRAM_LABELS = ('<1ms', '1-10ms', '10-100ms', '0.1-1s', '1-10s', '10-100s', '≥100s')
+
+    # labels of the fixture scopes in the slowest fixtures panel
+    FIXTURE_SCOPES = {
+        'module': u'[模块]',
+        'class': u'[类]',
+    }
+
+    # memory panels: (stats key ranked by, icon, title)
+    MEMORY_PANELS = (
+        ('mem_peak', 'bi bi-memory', u'内存分配峰值 Top %d'),
+        ('rss_delta', 'bi bi-box-arrow-up', u'RSS 增长 Top %d'),
+    )
+
+    # at most this many bars are drawn in the timeline, the longest ones
+    TIMELINE_MAX_BARS = 20000
+    # status shown for a test in the timeline when its subtests differ: the
+    # later in this tuple, the more severe
+    TIMELINE_SEVERITY = (3, 0, 1, 2)
+
     DEFAULT_TITLE = 'Unit Test Report'
     DEFAULT_DESCRIPTION = ''
 
@@ -124,14 +353,7 @@ class Template_mixin(object):
     <meta name="generator" content="%(generator)s"/>
     <title>%(title)s</title>
     
-    <!-- Bootstrap 5.3 -->
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.0/font/bootstrap-icons.css">
-    <!-- ECharts 5.x -->
-    <script src="https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js"></script>
-    <!-- Bootstrap 5 JS -->
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    
+    %(assets)s
     %(stylesheet)s
     
 </head>
@@ -199,6 +421,30 @@ class Template_mixin(object):
         }
     }
 
+    /* 按耗时排序 - key: wall / cpu; 类按合计耗时排序，类内用例按各自耗时排序 */
+    function sortByTime(key) {
+        const table = document.getElementById('result_table');
+        const tbody = table.tBodies[0];
+        const totalRow = document.getElementById('total_row');
+        const desc = table.getAttribute('data-sort') !== key + '-desc';
+        table.setAttribute('data-sort', key + (desc ? '-desc' : '-asc'));
+        const byTime = (a, b) => {
+            const d = parseFloat(a.getAttribute('data-' + key)) - parseFloat(b.getAttribute('data-' + key));
+            return desc ? -d : d;
+        };
+        const groups = [];
+        Array.from(tbody.rows).forEach(tr => {
+            if (tr === totalRow) return;
+            if (tr.id.charAt(0) === 'c') groups.push({head: tr, tests: []});
+            else if (groups.length) groups[groups.length - 1].tests.push(tr);
+        });
+        groups.sort((a, b) => byTime(a.head, b.head));
+        groups.forEach(g => {
+            tbody.insertBefore(g.head, totalRow);
+            g.tests.sort(byTime).forEach(tr => tbody.insertBefore(tr, totalRow));
+        });
+    }
+
     function showTestDetail(div_id){
         const details_div = document.getElementById(div_id);
         const displayState = details_div.style.display;
@@ -269,6 +515,8 @@ class Template_mixin(object):
             chart.dispose();
             initChart();
         }
+        // 分析面板中的图表
+        (window.reportCharts || []).forEach(init => init());
     }
     
     // 页面加载时恢复主题
@@ -286,7 +534,19 @@ class Template_mixin(object):
     %(chart_script)s
 </body>
 </html>
-"""  # variables: (title, generator, stylesheet, heading, report, ending, chart_script)
+"""  # variables: (title, generator, assets, stylesheet, heading, report, ending, chart_script)
+
+    # vendor assets from the CDN; HTMLTestRunner(inline_assets=True) embeds
+    # them instead, see htmltestrunner/assets.py
+    ASSETS_TMPL = """
+    <!-- Bootstrap 5.3 -->
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.0/font/bootstrap-icons.css">
+    <!-- ECharts 5.x -->
+    <script src="https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js"></script>
+    <!-- Bootstrap 5 JS -->
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+"""
 
     ECHARTS_SCRIPT = """
     <script type="text/javascript">
@@ -688,6 +948,108 @@ body {
     text-align: left;
     }
 
+    #result_table thead th.sortable {
+        cursor: pointer;
+        user-select: none;
+    }
+
+    .virtual-scroll {
+        max-height: 75vh;
+        overflow-y: auto;
+    }
+
+    .virtual-scroll #result_table thead th {
+        position: sticky;
+        top: 0;
+        z-index: 1;
+    }
+
+    #virtual_rows > tr > td {
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+        max-width: 480px;
+    }
+
+    .virtual-spacer > td {
+        padding: 0 !important;
+        border: none !important;
+    }
+
+    .virtual-detail {
+        position: fixed;
+        right: 24px;
+        bottom: 24px;
+        width: min(900px, calc(100vw - 48px));
+        z-index: 1050;
+        box-shadow: 0 6px 24px rgba(0, 0, 0, 0.15);
+    }
+
+    .virtual-detail .popup_window {
+        margin-top: 0;
+    }
+
+    .panel-grid {
+        display: grid;
+        grid-template-columns: repeat(auto-fit, minmax(480px, 1fr));
+        gap: 16px;
+        margin-bottom: 16px;
+    }
+
+    .panel-grid:empty {
+        display: none;
+    }
+
+    .report-panel {
+        margin-bottom: 0;
+        min-width: 0;
+    }
+
+    .fixture-cost {
+        font-size: 12px;
+        font-weight: normal;
+        margin-top: 2px;
+    }
+
+    .panel-wide {
+        grid-column: 1 / -1;
+    }
+
+    .timeline-legend {
+        display: inline-block;
+        width: 10px;
+        height: 10px;
+        border-radius: 2px;
+        margin: 0 4px 0 12px;
+    }
+
+    .panel-title {
+        font-size: 16px;
+        font-weight: 600;
+        color: var(--text-color);
+        margin-bottom: 12px;
+    }
+
+    .panel-note {
+        font-size: 13px;
+        margin-bottom: 8px;
+    }
+
+    .panel-table {
+        font-size: 13px;
+        margin-bottom: 0;
+    }
+
+    .panel-test {
+        word-break: break-all;
+    }
+
+    .duration {
+        font-family: SFMono-Regular, Consolas, 'Liberation Mono', Menlo, monospace;
+        font-size: 13px;
+        white-space: nowrap;
+    }
+
     [data-bs-theme="dark"] #result_table thead th {
         background: #141414;
 }
@@ -811,7 +1173,8 @@ body {
         gap: 8px;
     }
 
-    .popup_window_actions button {
+    .popup_window_actions button, .popup_window_actions .output-link {
+        text-decoration: none;
         background: white;
         border: 1px solid var(--border-color);
         border-radius: 4px;
@@ -825,11 +1188,11 @@ body {
         gap: 4px;
 }
 
-    [data-bs-theme="dark"] .popup_window_actions button {
+    [data-bs-theme="dark"] .popup_window_actions button, [data-bs-theme="dark"] .popup_window_actions .output-link {
         background: #1f1f1f;
     }
 
-    .popup_window_actions button:hover {
+    .popup_window_actions button:hover, .popup_window_actions .output-link:hover {
         border-color: var(--primary-color);
         color: var(--primary-color);
 }
@@ -937,7 +1300,7 @@ body {
     </h1>
     
         <!-- 统计卡片网格 -->
-        <div class='stats-grid'>
+        <div class='stats-grid' id='stats-grid'>
             %(parameters)s
     </div>
     
@@ -948,6 +1311,9 @@ body {
     <div class='chart-card'>
         <div id="chart" style="width:100%%;height:500px;"></div>
     </div>
+
+    <!-- 分析面板 -->
+    <div id='report-panels' class='panel-grid'>%(panels)s</div>
     
     <script>
     // 更新主题图标
@@ -966,7 +1332,276 @@ body {
         updateThemeIcon();
     };
     </script>
-"""  # variables: (title, parameters, description)
+"""  # variables: (title, parameters, description, panels)
+
+    # ------------------------------------------------------------------------
+    # Analysis panels shown below the chart
+    #
+
+    PANEL_TMPL = """
+        <div class='chart-card report-panel%(extra_class)s'>
+            <h2 class='panel-title'><i class='%(icon)s'></i> %(title)s</h2>
+            %(body)s
+        </div>
+"""  # variables: (extra_class, icon, title, body)
+
+    PANEL_NOTE_TMPL = """<p class='text-muted panel-note'>%(note)s</p>"""  # variables: (note)
+
+    REGRESSION_TABLE_TMPL = """
+            <p class='text-muted panel-note'>%(note)s</p>
+            <table class='table table-sm panel-table'>
+                <thead>
+                    <tr>
+                        <th>测试用例</th>
+                        <th class='text-end'>基线(s)</th>
+                        <th class='text-end'>本次(s)</th>
+                        <th class='text-end'>变化</th>
+                    </tr>
+                </thead>
+                <tbody>%(rows)s</tbody>
+            </table>
+"""  # variables: (note, rows)
+
+    SLOWEST_TABLE_TMPL = """
+            <table class='table table-sm panel-table'>
+                <thead>
+                    <tr>
+                        <th class='text-end' style='width: 48px;'>#</th>
+                        <th>%(name)s</th>
+                        <th class='text-end'>耗时(s)</th>
+                        <th class='text-end'>CPU(s)</th>
+                    </tr>
+                </thead>
+                <tbody>%(rows)s</tbody>
+            </table>
+"""  # variables: (name, rows)
+
+    SLOWEST_ROW_TMPL = """
+                    <tr>
+                        <td class='text-end text-muted'>%(rank)s</td>
+                        <td class='panel-test'>%(name)s</td>
+                        <td class='text-end duration'>%(wall)s</td>
+                        <td class='text-end duration'>%(cpu)s</td>
+                    </tr>
+"""  # variables: (rank, name, wall, cpu)
+
+    HISTOGRAM_TMPL = """
+            <div id='duration-histogram' style='width:100%%;height:320px;'></div>
+            <script type="text/javascript">
+            function initDurationHistogram() {
+                const dom = document.getElementById('duration-histogram');
+                const old = echarts.getInstanceByDom(dom);
+                if (old) old.dispose();
+                const chart = echarts.init(dom);
+                const isDark = document.documentElement.getAttribute('data-bs-theme') === 'dark';
+                const textColor = isDark ? '#a6a6a6' : '#8c8c8c';
+                chart.setOption({
+                    tooltip: { trigger: 'axis', axisPointer: { type: 'shadow' } },
+                    grid: { left: 56, right: 16, top: 32, bottom: 48 },
+                    xAxis: {
+                        type: 'category',
+                        data: %(labels)s,
+                        name: '耗时',
+                        nameLocation: 'middle',
+                        nameGap: 32,
+                        axisLabel: { color: textColor },
+                        nameTextStyle: { color: textColor }
+                    },
+                    yAxis: {
+                        type: 'value',
+                        name: '用例数',
+                        minInterval: 1,
+                        axisLabel: { color: textColor },
+                        nameTextStyle: { color: textColor }
+                    },
+                    series: [{
+                        name: '用例数',
+                        type: 'bar',
+                        data: %(counts)s,
+                        barCategoryGap: '12%%',
+                        itemStyle: { color: '#1890ff', borderRadius: [4, 4, 0, 0] }
+                    }]
+                });
+            }
+            window.reportCharts = (window.reportCharts || []).concat([initDurationHistogram]);
+            window.addEventListener('resize', function() {
+                const chart = echarts.getInstanceByDom(document.getElementById('duration-histogram'));
+                if (chart) chart.resize();
+            });
+            if (document.readyState === 'loading') {
+                document.addEventListener('DOMContentLoaded', initDurationHistogram);
+            } else {
+                initDurationHistogram();
+            }
+            </script>
+"""  # variables: (labels, counts)
+
+    TIMELINE_TMPL = """
+            <p class='text-muted panel-note'>%(note)s
+                <span class='timeline-legend' style='background:#52c41a'></span>通过
+                <span class='timeline-legend' style='background:#faad14'></span>失败
+                <span class='timeline-legend' style='background:#ff4d4f'></span>错误
+                <span class='timeline-legend' style='background:#1890ff'></span>跳过
+                <span class='timeline-legend' style='background:#9254de'></span>夹具 (setUpClass 等)
+            </p>
+            <div id='timeline-chart' style='width:100%%;height:%(height)dpx;'></div>
+            <script type="text/javascript">
+            function initTimeline() {
+                const dom = document.getElementById('timeline-chart');
+                const old = echarts.getInstanceByDom(dom);
+                if (old) old.dispose();
+                const chart = echarts.init(dom);
+                const isDark = document.documentElement.getAttribute('data-bs-theme') === 'dark';
+                const textColor = isDark ? '#a6a6a6' : '#8c8c8c';
+                const colors = ['#52c41a', '#faad14', '#ff4d4f', '#1890ff', '#9254de'];
+                const kinds = %(kinds)s;
+                const names = %(names)s;
+                // [lane, start, end, kind, name] with seconds since the run started
+                const bars = %(bars)s;
+                chart.setOption({
+                    tooltip: {
+                        formatter: function(p) {
+                            const d = p.value;
+                            return echarts.format.encodeHTML(names[d[4]]) + '<br/>' + kinds[d[3]] + ' ' +
+                                (d[2] - d[1]).toFixed(3) + 's (' + d[1].toFixed(3) + 's - ' + d[2].toFixed(3) + 's)';
+                        }
+                    },
+                    dataZoom: [
+                        { type: 'slider', filterMode: 'weakFilter', showDataShadow: false, height: 16, bottom: 8 },
+                        { type: 'inside', filterMode: 'weakFilter' }
+                    ],
+                    grid: { left: 96, right: 24, top: 8, bottom: 64 },
+                    xAxis: {
+                        type: 'value',
+                        min: 0,
+                        name: '秒',
+                        axisLabel: { color: textColor },
+                        nameTextStyle: { color: textColor }
+                    },
+                    yAxis: {
+                        type: 'category',
+                        data: %(lanes)s,
+                        inverse: true,
+                        axisLabel: { color: textColor }
+                    },
+                    series: [{
+                        type: 'custom',
+                        renderItem: function(params, api) {
+                            const lane = api.value(0);
+                            const start = api.coord([api.value(1), lane]);
+                            const end = api.coord([api.value(2), lane]);
+                            const height = api.size([0, 1])[1] * 0.6;
+                            const shape = echarts.graphic.clipRectByRect({
+                                x: start[0],
+                                y: start[1] - height / 2,
+                                width: Math.max(end[0] - start[0], 1),
+                                height: height
+                            }, params.coordSys);
+                            return shape && { type: 'rect', shape: shape, style: { fill: colors[api.value(3)] } };
+                        },
+                        encode: { x: [1, 2], y: 0 },
+                        data: bars
+                    }]
+                });
+            }
+            window.reportCharts = (window.reportCharts || []).concat([initTimeline]);
+            window.addEventListener('resize', function() {
+                const chart = echarts.getInstanceByDom(document.getElementById('timeline-chart'));
+                if (chart) chart.resize();
+            });
+            if (document.readyState === 'loading') {
+                document.addEventListener('DOMContentLoaded', initTimeline);
+            } else {
+                initTimeline();
+            }
+            </script>
+"""  # variables: (note, height, kinds, names, bars, lanes)
+
+    MEMORY_TABLE_TMPL = """
+            <table class='table table-sm panel-table'>
+                <thead>
+                    <tr>
+                        <th class='text-end' style='width: 48px;'>#</th>
+                        <th>测试用例</th>
+                        <th class='text-end' title='tracemalloc: 用例执行期间的分配峰值'>分配峰值</th>
+                        <th class='text-end' title='tracemalloc: 用例结束时仍未释放的内存'>未释放</th>
+                        <th class='text-end' title='进程常驻内存的变化'>RSS 增长</th>
+                    </tr>
+                </thead>
+                <tbody>%(rows)s</tbody>
+            </table>
+"""  # variables: (rows)
+
+    MEMORY_ROW_TMPL = """
+                    <tr>
+                        <td class='text-end text-muted'>%(rank)s</td>
+                        <td class='panel-test'>%(name)s</td>
+                        <td class='text-end duration'>%(peak)s</td>
+                        <td class='text-end duration'>%(delta)s</td>
+                        <td class='text-end duration'>%(rss)s</td>
+                    </tr>
+"""  # variables: (rank, name, peak, delta, rss)
+
+    LEAK_TABLE_TMPL = """
+            <p class='text-muted panel-note'>用例结束后仍存在、开始时没有的线程、文件描述符和子进程</p>
+            <table class='table table-sm panel-table'>
+                <thead>
+                    <tr>
+                        <th>测试用例</th>
+                        <th>泄漏的资源</th>
+                    </tr>
+                </thead>
+                <tbody>%(rows)s</tbody>
+            </table>
+"""  # variables: (rows)
+
+    LEAK_ROW_TMPL = """
+                    <tr>
+                        <td class='panel-test'>%(name)s</td>
+                        <td class='panel-test duration'>%(leaks)s</td>
+                    </tr>
+"""  # variables: (name, leaks)
+
+    HOT_FUNCTION_TABLE_TMPL = """
+            <table class='table table-sm panel-table'>
+                <thead>
+                    <tr>
+                        <th class='text-end' style='width: 48px;'>#</th>
+                        <th>函数</th>
+                        <th class='text-end'>调用次数</th>
+                        <th class='text-end'>自身耗时(s)</th>
+                        <th class='text-end'>累计耗时(s)</th>
+                    </tr>
+                </thead>
+                <tbody>%(rows)s</tbody>
+            </table>
+"""  # variables: (rows)
+
+    HOT_FUNCTION_ROW_TMPL = """
+                    <tr>
+                        <td class='text-end text-muted'>%(rank)s</td>
+                        <td class='panel-test'>%(function)s</td>
+                        <td class='text-end'>%(calls)s</td>
+                        <td class='text-end duration'>%(tottime)s</td>
+                        <td class='text-end duration'>%(cumtime)s</td>
+                    </tr>
+"""  # variables: (rank, function, calls, tottime, cumtime)
+
+    PROFILE_FILES_TMPL = """
+            <p class='text-muted panel-note' style='margin-top: 12px;'>最慢用例的 profile 文件（可用 <code>python -m pstats</code> 或 snakeviz 查看）：</p>
+            <ul class='panel-table'>%(links)s</ul>
+"""  # variables: (links)
+
+    PROFILE_LINK_TMPL = """<li><a href="%(href)s" download class='panel-test'>%(name)s</a></li>"""  # variables: (href, name)
+
+    REGRESSION_ROW_TMPL = """
+                    <tr>
+                        <td class='panel-test'>%(test_id)s</td>
+                        <td class='text-end duration'>%(baseline)s</td>
+                        <td class='text-end duration'>%(current)s</td>
+                        <td class='text-end'><span class='badge bg-danger'>%(ratio)s</span></td>
+                    </tr>
+"""  # variables: (test_id, baseline, current, ratio)
 
     HEADING_ATTRIBUTE_TMPL = """
             <div class='stat-card %(card_class)s'>
@@ -1009,6 +1644,8 @@ body {
                         <th class="text-center" style="width: 100px;"><i class="bi bi-x-circle"></i> 失败</th>
                         <th class="text-center" style="width: 100px;"><i class="bi bi-exclamation-circle"></i> 错误</th>
                         <th class="text-center" style="width: 100px;"><i class="bi bi-dash-circle"></i> 跳过</th>
+                        <th class="text-center sortable" style="width: 110px;" onclick="sortByTime('wall')" title="按耗时排序"><i class="bi bi-stopwatch"></i> 耗时(s)</th>
+                        <th class="text-center sortable" style="width: 110px;" onclick="sortByTime('cpu')" title="按CPU时间排序"><i class="bi bi-cpu"></i> CPU(s)</th>
                         <th class="text-center" style="width: 120px;"><i class="bi bi-eye"></i> 查看</th>
                 </tr>
             </thead>
@@ -1021,34 +1658,49 @@ body {
     <td class="text-center"><span class="badge bg-warning">%(fail)s</span></td>
     <td class="text-center"><span class="badge bg-danger">%(error)s</span></td>
     <td class="text-center"><span class="badge bg-primary">%(skip)s</span></td>
+    <td class="text-center duration"><strong>%(wall)s</strong></td>
+    <td class="text-center duration"><strong>%(cpu)s</strong></td>
     <td>&nbsp;</td>
                     </tr>
                 </tbody>
             </table>
         </div>
     </div>
-"""  # variables: (test_list, count, Pass, fail, error, skip)
+"""  # variables: (test_list, count, Pass, fail, error, skip, wall, cpu)
 
     REPORT_CLASS_TMPL = u"""
-    <tr class='%(style)s'>
+    <tr id='%(cid)s' class='%(style)s' data-wall='%(wall)s' data-cpu='%(cpu)s'>
         <td>
-            <strong><i class="bi bi-folder-fill"></i> %(desc)s</strong>
+            <strong><i class="bi bi-folder-fill"></i> %(desc)s</strong>%(fixtures)s
         </td>
     <td class="text-center">%(count)s</td>
         <td class="text-center"><span class="badge bg-success">%(Pass)s</span></td>
     <td class="text-center"><span class="badge bg-warning">%(fail)s</span></td>
     <td class="text-center"><span class="badge bg-danger">%(error)s</span></td>
     <td class="text-center"><span class="badge bg-primary">%(skip)s</span></td>
+    <td class="text-center duration">%(wall)s</td>
+    <td class="text-center duration">%(cpu)s</td>
     <td class="text-center">
             <a href="javascript:showClassDetail('%(cid)s',%(count)s)" class="btn btn-sm btn-outline-primary">
                 <i class="bi bi-chevron-down"></i> 详情
             </a>
     </td>
     </tr>
-"""  # variables: (style, desc, count, Pass, fail, error, skip, cid)
+"""  # variables: (style, desc, fixtures, count, Pass, fail, error, skip, wall, cpu, cid)
+
+    REPORT_CLASS_FIXTURES_TMPL = u"""
+            <div class='fixture-cost text-muted' title='setUpClass/tearDownClass 不计入测试类耗时'>
+                <i class="bi bi-gear"></i> 夹具 setUpClass/tearDownClass <span class='duration'>%(cls)s</span>s ·
+                setUp/tearDown <span class='duration'>%(test)s</span>s
+            </div>"""  # variables: (cls, test)
+
+    # report_mode='virtual' needs class rows as high as test rows: the costs
+    # go into a tooltip
+    REPORT_CLASS_FIXTURES_INLINE_TMPL = u"""
+            <span class='fixture-cost text-muted ms-2' title='夹具 setUpClass/tearDownClass %(cls)ss · setUp/tearDown %(test)ss（不计入测试类耗时）'><i class="bi bi-gear"></i></span>"""  # variables: (cls, test)
 
     REPORT_TEST_WITH_OUTPUT_TMPL = r"""
-<tr id='%(tid)s' style='display:none;'>
+<tr id='%(tid)s' style='display:none;' data-wall='%(wall)s' data-cpu='%(cpu)s'>
     <td class='%(style)s'>
         <div class='testcase'>
             <i class="bi bi-file-earmark-code"></i> %(desc)s
@@ -1064,6 +1716,7 @@ body {
             <div class="popup_window_header">
                 <strong><i class="bi bi-terminal"></i> 执行详情</strong>
                 <div class="popup_window_actions">
+                    %(output_link)s
                     <button onclick="copyTestDetail('content_%(tid)s', this)" title="复制内容">
                         <i class="bi bi-clipboard"></i> 复制
                     </button>
@@ -1077,11 +1730,297 @@ body {
             </div>
         </div>
     </td>
+    <td class="text-center duration">%(wall)s</td>
+    <td class="text-center duration">%(cpu)s</td>
+    <td>&nbsp;</td>
 </tr>
-"""  # variables: (tid, Class, style, desc, status)
+"""  # variables: (tid, Class, style, desc, status, wall, cpu, output_link)
+
+    REPORT_OUTPUT_LINK_TMPL = r"""<a href="%(href)s" target="_blank" class="output-link" title="查看完整输出">
+                        <i class="bi bi-box-arrow-up-right"></i> 完整输出
+                    </a>"""  # variables: (href)
 
     REPORT_TEST_OUTPUT_TMPL = r"""%(id)s: %(output)s"""  # variables: (id, output)
 
+    # ------------------------------------------------------------------------
+    # Client side rendering (report_mode='json' and 'virtual')
+    #
+    # Instead of the test rows, each class row is followed by a JSON data
+    # island holding its tests in columnar arrays. Test rows are created when
+    # a class is expanded or a filter needs them, popups when they are opened.
+    # In 'virtual' mode the class row itself lives in the island as well and
+    # only the rows inside the visible window of the table are materialized.
+
+    REPORT_CLASS_DATA_TMPL = u"""
+    <script type="application/json" id='data_%(cid)s'>%(data)s</script>
+"""  # variables: (cid, data)
+
+    CLIENT_DATA_SCRIPT = r"""
+    <script type="text/javascript">
+    const STATUS_LABELS = %(status)s;
+    const STATUS_STYLES = ['none', 'failCase', 'errorCase', 'skipCase'];
+    const classDataCache = {};
+
+    function classData(cid) {
+        if (!(cid in classDataCache)) {
+            const island = document.getElementById('data_' + cid);
+            classDataCache[cid] = island ? JSON.parse(island.textContent) : null;
+        }
+        return classDataCache[cid];
+    }
+
+    function testId(cid, i, n) {
+        const prefix = n === 0 ? 'p' : (n === 3 ? 's' : 'f');
+        return prefix + 't' + cid.substr(1) + '.' + (i + 1);
+    }
+
+    function createTestRow(cid, i, d) {
+        const n = d.n[i];
+        const tid = testId(cid, i, n);
+        const tr = document.createElement('tr');
+        tr.id = tid;
+        tr.style.display = 'none';
+        tr.setAttribute('data-wall', d.wall[i].toFixed(3));
+        tr.setAttribute('data-cpu', d.cpu[i].toFixed(3));
+        tr.innerHTML =
+            "<td class='" + STATUS_STYLES[n] + "'><div class='testcase'><i class='bi bi-file-earmark-code'></i> </div></td>" +
+            "<td colspan='5'><div class='text-center'>" +
+            "<a class='popup_link btn btn-sm btn-outline-info' href=\"javascript:showTestDetail('div_" + tid + "')\">" +
+            "<i class='bi bi-info-circle'></i> " + STATUS_LABELS[n] + "</a></div></td>" +
+            "<td class='text-center duration'>" + d.wall[i].toFixed(3) + "</td>" +
+            "<td class='text-center duration'>" + d.cpu[i].toFixed(3) + "</td><td>&nbsp;</td>";
+        tr.querySelector('.testcase').appendChild(document.createTextNode(d.desc[i]));
+        return tr;
+    }
+
+    function renderClass(cid) {
+        const classRow = document.getElementById(cid);
+        if (!classRow || classRow.getAttribute('data-rendered')) return;
+        classRow.setAttribute('data-rendered', '1');
+        const d = classData(cid);
+        if (!d) return;
+        const frag = document.createDocumentFragment();
+        for (let i = 0; i < d.n.length; i++) {
+            frag.appendChild(createTestRow(cid, i, d));
+        }
+        classRow.parentNode.insertBefore(frag, classRow.nextSibling);
+    }
+
+    function createTestDetail(div_id) {
+        const tid = div_id.substr(4);
+        const parts = tid.substr(2).split('.');
+        const cid = 'c' + parts[0];
+        const i = parseInt(parts[1], 10) - 1;
+        const d = classData(cid);
+        const link = d.link[i] ?
+            "<a target='_blank' class='output-link' title='查看完整输出'><i class='bi bi-box-arrow-up-right'></i> 完整输出</a>" : '';
+        const div = document.createElement('div');
+        div.id = div_id;
+        div.className = 'popup_window';
+        div.innerHTML =
+            "<div class='popup_window_header'><strong><i class='bi bi-terminal'></i> 执行详情</strong>" +
+            "<div class='popup_window_actions'>" + link +
+            "<button onclick=\"copyTestDetail('content_" + tid + "', this)\" title='复制内容'><i class='bi bi-clipboard'></i> 复制</button>" +
+            "<button onclick=\"showTestDetail('" + div_id + "')\" title='关闭'><i class='bi bi-x-lg'></i></button>" +
+            "</div></div><div class='popup_window_content'><pre></pre></div>";
+        if (link) div.querySelector('.output-link').setAttribute('href', d.link[i]);
+        const pre = div.querySelector('pre');
+        pre.id = 'content_' + tid;
+        pre.textContent = tid + ': ' + (d.out[i] || '无输出信息');
+        return div;
+    }
+    </script>
+"""  # variables: (status)
+
+    CLIENT_RENDER_SCRIPT = r"""
+    <script type="text/javascript">
+    const domShowCase = showCase;
+    window.showCase = function(level) {
+        document.querySelectorAll('#result_table tr[id^="c"]').forEach(tr => {
+            if (level > 1 || (level > 0 && /errorClass|failClass/.test(tr.className))) renderClass(tr.id);
+        });
+        domShowCase(level);
+    };
+
+    const domShowClassDetail = showClassDetail;
+    window.showClassDetail = function(cid, count) {
+        renderClass(cid);
+        domShowClassDetail(cid, count);
+    };
+
+    const domShowTestDetail = showTestDetail;
+    window.showTestDetail = function(div_id) {
+        if (!document.getElementById(div_id)) {
+            const tr = document.getElementById(div_id.substr(4));
+            if (!tr) return;
+            tr.cells[1].appendChild(createTestDetail(div_id));
+        }
+        domShowTestDetail(div_id);
+    };
+    </script>
+"""
+
+    VIRTUAL_SCROLL_SCRIPT = r"""
+    <script type="text/javascript">
+    /* 虚拟滚动: 只渲染可见窗口内的行; 过滤、展开和排序都作用于内存中的索引 */
+    const virtual = {
+        classes: [],    // cid, in display order
+        order: {},      // cid -> test indexes, in display order
+        state: {},      // cid -> true / false once toggled by showClassDetail
+        rows: {},       // cid -> parsed class row
+        level: 0,
+        index: [],      // visible rows: [cid, -1] for a class, [cid, i] for a test
+        rowHeight: 50,
+        overscan: 10,
+        body: null,
+        scroller: null,
+        pending: false,
+    };
+
+    function testVisible(cid, n) {
+        const toggled = virtual.state[cid];
+        if (toggled !== undefined) return toggled;
+        return virtual.level > 1 || (virtual.level > 0 && (n === 1 || n === 2));
+    }
+
+    function buildIndex() {
+        const index = [];
+        virtual.classes.forEach(cid => {
+            const d = classData(cid);
+            index.push([cid, -1]);
+            virtual.order[cid].forEach(i => {
+                if (testVisible(cid, d.n[i])) index.push([cid, i]);
+            });
+        });
+        virtual.index = index;
+        renderWindow();
+    }
+
+    function classRow(cid) {
+        if (!virtual.rows[cid]) {
+            const tbody = document.createElement('tbody');
+            tbody.innerHTML = classData(cid).row;
+            virtual.rows[cid] = tbody.firstElementChild;
+        }
+        return virtual.rows[cid];
+    }
+
+    function spacerRow(height) {
+        const tr = document.createElement('tr');
+        tr.className = 'virtual-spacer';
+        tr.style.height = height + 'px';
+        tr.innerHTML = "<td colspan='9'></td>";
+        return tr;
+    }
+
+    function renderWindow() {
+        virtual.pending = false;
+        const h = virtual.rowHeight;
+        const top = virtual.scroller.scrollTop;
+        const first = Math.max(0, Math.floor(top / h) - virtual.overscan);
+        const last = Math.min(virtual.index.length,
+            Math.ceil((top + virtual.scroller.clientHeight) / h) + virtual.overscan);
+        const frag = document.createDocumentFragment();
+        frag.appendChild(spacerRow(first * h));
+        for (let k = first; k < last; k++) {
+            const [cid, i] = virtual.index[k];
+            let tr;
+            if (i < 0) {
+                tr = classRow(cid);
+            } else {
+                tr = createTestRow(cid, i, classData(cid));
+                tr.style.display = '';
+            }
+            frag.appendChild(tr);
+        }
+        frag.appendChild(spacerRow((virtual.index.length - last) * h));
+        virtual.body.replaceChildren(frag);
+    }
+
+    function scheduleRender() {
+        if (virtual.pending) return;
+        virtual.pending = true;
+        requestAnimationFrame(renderWindow);
+    }
+
+    window.showCase = function(level) {
+        virtual.level = level;
+        virtual.state = {};
+        virtual.scroller.scrollTop = 0;
+        buildIndex();
+        document.querySelectorAll('.filter-btn').forEach(btn => btn.classList.remove('active'));
+        event.target.classList.add('active');
+    };
+
+    window.showClassDetail = function(cid, count) {
+        const d = classData(cid);
+        const showing = virtual.order[cid].some(i => testVisible(cid, d.n[i]));
+        virtual.state[cid] = !showing;
+        buildIndex();
+    };
+
+    window.sortByTime = function(key) {
+        const table = document.getElementById('result_table');
+        const desc = table.getAttribute('data-sort') !== key + '-desc';
+        table.setAttribute('data-sort', key + (desc ? '-desc' : '-asc'));
+        const sign = desc ? -1 : 1;
+        const total = {};
+        virtual.classes.forEach(cid => {
+            const values = classData(cid)[key];
+            total[cid] = values.reduce((a, b) => a + b, 0);
+            virtual.order[cid].sort((a, b) => sign * (values[a] - values[b]));
+        });
+        virtual.classes.sort((a, b) => sign * (total[a] - total[b]));
+        buildIndex();
+    };
+
+    window.showTestDetail = function(div_id) {
+        let panel = document.getElementById('virtual_detail');
+        if (!panel) {
+            panel = document.createElement('div');
+            panel.id = 'virtual_detail';
+            panel.className = 'virtual-detail';
+            document.body.appendChild(panel);
+        }
+        const open = panel.firstElementChild;
+        panel.replaceChildren();
+        if (open && open.id === div_id) return;
+        const div = createTestDetail(div_id);
+        div.style.display = 'block';
+        panel.appendChild(div);
+    };
+
+    function initVirtualTable() {
+        const table = document.getElementById('result_table');
+        virtual.scroller = table.closest('.table-responsive');
+        virtual.scroller.classList.add('virtual-scroll');
+        virtual.body = document.createElement('tbody');
+        virtual.body.id = 'virtual_rows';
+        table.insertBefore(virtual.body, table.tBodies[0]);
+        document.querySelectorAll('script[id^="data_c"]').forEach(island => {
+            const cid = island.id.substr(5);
+            virtual.classes.push(cid);
+            virtual.order[cid] = classData(cid).n.map((n, i) => i);
+        });
+        buildIndex();
+        // 以实际渲染的行高为准 (测试类行与测试行等高)
+        const sample = virtual.body.rows[1];
+        if (sample && sample.offsetHeight && sample.offsetHeight !== virtual.rowHeight) {
+            virtual.rowHeight = sample.offsetHeight;
+            renderWindow();
+        }
+        virtual.scroller.addEventListener('scroll', scheduleRender);
+        window.addEventListener('resize', scheduleRender);
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', initVirtualTable);
+    } else {
+        initVirtualTable();
+    }
+    </script>
+"""
+
     # ------------------------------------------------------------------------
     # ENDING
     #
@@ -1127,7 +2066,8 @@ class _TestResult(TestResult):
     # note: _TestResult is a pure representation of results.
     # It lacks the output and reporting ability compares to unittest._TextTestResult.
     
-    def __init__(self, verbosity=1):
+    def __init__(self, verbosity=1, output_limit=None, output_dir=None, profile=False, profile_slowest=0,
+                 memory=False, detect_leaks=False, fail_on_leaks=False):
         TestResult.__init__(self)
         self.stdout0 = None
         self.stderr0 = None
@@ -1137,28 +2077,249 @@ class _TestResult(TestResult):
         self.skip_count = 0
         self.verbosity = verbosity
 
-        # result is a list of result in 4 tuple
+        # result is a list of result in 5 tuple
         # (
         #   result code (0: success; 1: fail; 2: error; 3: skip),
         #   TestCase object,
         #   Test output (byte string),
         #   stack trace,
+        #   stats dict: wall / cpu seconds of the test (or subtest), its
+        #               start / end as epoch seconds, the worker that ran
+        #               it, on the first record of a test the setup and
+        #               teardown seconds (setUp, tearDown and cleanups)
+        #               and with memory its mem_peak, mem_delta and
+        #               rss_delta bytes, with detect_leaks the leaks it
+        #               left behind, and, if its output was spilled,
+        #               output_file,
         # )
         self.result = []
-        self.subtestlist = []
+        # tests whose passing subtests were already recorded, so addSuccess
+        # must not record the test again. A set (TestCase is hashable) keeps
+        # the lookup O(1); stopTest drops the entry of the finished test so
+        # it never holds more than the running one.
+        self.subtestlist = set()
+        # objects notified of every record appended to self.result, e.g.
+        # the streaming report writer or the JSONL exporter; see _append()
+        self.listeners = []
+        # False: self.result keeps the records without output and stack
+        # trace, which only the listeners get (the streaming report)
+        self.keep_output = True
         self.outputBuffer = io.StringIO()
+        # where the redirectors send the output of the running test
+        self._capture = _Capture()
+        self._context = None
+        # per test capture cap in characters (None: unbounded) and directory
+        # receiving the full output of tests that exceed it
+        self.output_limit = output_limit
+        self.output_dir = output_dir
         self.test_start_time = round(time.time(), 2)
+        # lane of this process (or thread) in the report's timeline, and the class and
+        # module fixtures timed by _TimedSuite as dicts of kind, name,
+        # start, end, wall, cpu and worker
+        self.worker = 'pid %d' % os.getpid()
+        if threading.current_thread() is not threading.main_thread():
+            self.worker += ' ' + threading.current_thread().name
+        self.fixtures = []
+        # fixture seconds per class ('class', name) and module ('module',
+        # name): [wall, cpu] summed over setUp*/tearDown* and workers
+        self.fixture_totals = {}
+        # converts perf_counter() readings to epoch seconds
+        self._epoch = time.time() - time.perf_counter()
+
+        # timing of the running test: (perf_counter, process_time) at
+        # startTest and at the last subtest, plus the stats dicts of its
+        # test level records, with the reading each starts from, which
+        # stopTest finalizes.
+        self._current = None
+        self._started = self._mark = (0.0, 0.0)
+        self._open_stats = []
+        self._unnotified = []
+        # seconds spent in setUp and tearDown (with cleanups) of the running test
+        self._phases = dict(setup=0.0, teardown=0.0)
+
+        # with profile, every test runs under cProfile: self.profile is the
+        # pstats.Stats of all tests merged and self.profiles a min-heap of
+        # (wall, test id, raw pstats dict) of the profile_slowest slowest
+        self.profile = pstats.Stats() if profile or profile_slowest else None
+        self.profile_slowest = profile_slowest
+        self.profiles = []
+        self._profiler = None
+
+        # with memory, tracemalloc (started by the first test, stopped by
+        # stopTestRun) and the RSS are sampled around every test
+        self.memory = memory
+        self._tracing = False
+        self._memory_mark = None
+
+        # with detect_leaks, threads, file descriptors and child processes
+        # that a test leaves behind are recorded; fail_on_leaks turns its
+        # passing record into a failure
+        self.detect_leaks = detect_leaks or fail_on_leaks
+        self.fail_on_leaks = fail_on_leaks
+        self._resource_mark = None
+
+    # TestCase methods timed into self._phases: (method, phase)
+    PHASES = (
+        ('_callSetUp', 'setup'),
+        ('_callTearDown', 'teardown'),
+        ('doCleanups', 'teardown'),
+    )
+
+    def _append(self, item):
+        self.result.append(self._kept(item))
+        if item[1] is self._current:
+            # listeners get the records of a running test from stopTest,
+            # once their stats are final
+            self._unnotified.append(item)
+        else:
+            self._notify(item)
+
+    def _kept(self, item):
+        """ The form a record is kept in self.result, see keep_output """
+        if self.keep_output:
+            return item
+        n, t, o, e, stats = item
+        return (n, t, '', '', stats)
+
+    def _notify(self, item):
+        for listener in self.listeners:
+            listener.add_record(item)
+
+    @staticmethod
+    def _clock():
+        return time.perf_counter(), time.process_time()
+
+    def _test_stats(self, test):
+        """
+        Return the stats dict for a test level record. The dict is updated
+        in stopTest so that it covers tearDown and cleanups as well. After
+        subtest records it starts where the last subtest ended, so that the
+        records of a test add up to its run time.
+        """
+        if test is not self._current:
+            # e.g. the _ErrorHolder of a failing setUpClass
+            return dict(wall=0.0, cpu=0.0)
+        stats = self._new_stats(self._mark, self._clock())
+        self._open_stats.append((stats, self._mark))
+        return stats
+
+    def _subtest_stats(self, subtest):
+        """ Return the stats dict of a subtest: time since the previous one """
+        now = self._clock()
+        stats = self._new_stats(self._mark, now)
+        stats['subtest'] = str(subtest)
+        self._mark = now
+        return stats
+
+    def _new_stats(self, since, now):
+        """ Return the stats dict of the span between two _clock() readings """
+        stats = dict(wall=now[0] - since[0], cpu=now[1] - since[1],
+                     start=self._epoch + since[0], end=self._epoch + now[0], worker=self.worker)
+        if getattr(self.outputBuffer, 'spilled', False):
+            stats['output_file'] = self.outputBuffer.spill_path
+        return stats
 
     def startTest(self, test):
         TestResult.startTest(self, test)
+        self._current = test
+        self._open_stats = []
+        self._phases = dict(setup=0.0, teardown=0.0)
+        for name, phase in self.PHASES:
+            self._time_phase(test, name, phase)
+        if self.memory:
+            self._memory_mark = self._sample_memory()
+        if self.detect_leaks:
+            self._resource_mark = _sample_resources()
+        self._started = self._mark = self._clock()
+        if self.profile is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
         # just one buffer for both stdout and stderr
-        self.outputBuffer = io.StringIO()
-        stdout_redirector.fp = self.outputBuffer
-        stderr_redirector.fp = self.outputBuffer
-        self.stdout0 = sys.stdout
-        self.stderr0 = sys.stderr
-        sys.stdout = stdout_redirector
-        sys.stderr = stderr_redirector
+        self.outputBuffer = self._new_output_buffer(test)
+        self._capture.buffer = self.outputBuffer
+        # the context async test cases run their code in (Python 3.11+)
+        self._context = getattr(test, '_asyncioTestContext', None)
+        stdout_redirector.capture(self._capture, self._context)
+        stderr_redirector.capture(self._capture, self._context)
+        if sys.stdout is not stdout_redirector:
+            # used without HTMLTestRunner.run(): swap the streams per test
+            self.stdout0 = sys.stdout
+            self.stderr0 = sys.stderr
+            sys.stdout = stdout_redirector
+            sys.stderr = stderr_redirector
+
+    def _sample_memory(self):
+        """ Return (traced bytes, RSS bytes) and restart the tracemalloc peak """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0], _rss()
+
+    def _memory_stats(self):
+        """ Memory growth of the running test since startTest """
+        traced, rss = self._memory_mark
+        current, peak = tracemalloc.get_traced_memory()
+        stats = dict(mem_delta=current - traced)
+        if hasattr(tracemalloc, 'reset_peak'):
+            # before Python 3.9 the peak covers the whole run
+            stats['mem_peak'] = peak - traced
+        if rss is not None:
+            stats['rss_delta'] = _rss() - rss
+        return stats
+
+    def _check_leaks(self, records):
+        """
+        Compare the resources with those at startTest and record what the
+        test leaked on its first record (``records`` are those of the
+        test, the last ones of self.result).
+        """
+        leaks = _resource_leaks(self._resource_mark, _sample_resources(records[0][1]))
+        if not leaks:
+            return
+        n, t, o, e, stats = records[0]
+        stats['leaks'] = leaks
+        message = 'Leaked resources:\n' + '\n'.join('  ' + leak for leak in leaks)
+        if self.fail_on_leaks and n == 0:
+            n = 1
+            self.success_count -= 1
+            self.failure_count += 1
+            self.failures.append((t, message))
+        records[0] = (n, t, o, e + '\n' + message if e else message, stats)
+        self.result[len(self.result) - len(records)] = self._kept(records[0])
+
+    def stopTestRun(self):
+        TestResult.stopTestRun(self)
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def _time_phase(self, test, name, phase):
+        """
+        Shadow method ``name`` of the test instance with a wrapper adding
+        its duration to self._phases[phase]; stopTest removes the wrapper.
+        """
+        method = getattr(test, name, None)
+        if method is None:
+            return
+        phases = self._phases
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                phases[phase] += time.perf_counter() - start
+        setattr(test, name, timed)
+
+    def _new_output_buffer(self, test):
+        if not self.output_limit:
+            return io.StringIO()
+        spill_path = None
+        if self.output_dir:
+            spill_path = os.path.join(self.output_dir, _file_name(test.id()) + '.txt')
+        return BoundedOutputBuffer(self.output_limit, spill_path)
 
     def complete_output(self):
         """
@@ -1170,20 +2331,55 @@ class _TestResult(TestResult):
             sys.stderr = self.stderr0
             self.stdout0 = None
             self.stderr0 = None
+        self._capture.buffer = None
+        stdout_redirector.capture(None)
+        stderr_redirector.capture(None)
         return self.outputBuffer.getvalue()
 
     def stopTest(self, test):
         # Usually one of addSuccess, addError or addFailure would have been called.
         # But there are some path in unittest that would bypass this.
         # We must disconnect stdout in stopTest(), which is guaranteed to be called.
+        if self._profiler is not None:
+            self._profiler.disable()
         self.complete_output()
+        if self._context is not None:
+            # the test keeps its context: do not leave our _Capture in it
+            # (complete_output may run inside it, which cannot be entered)
+            stdout_redirector.capture(None, self._context)
+            stderr_redirector.capture(None, self._context)
+            self._context = None
+        if isinstance(self.outputBuffer, BoundedOutputBuffer):
+            self.outputBuffer.close()
+        self.subtestlist.discard(test)
+        for name, phase in self.PHASES:
+            test.__dict__.pop(name, None)
+        if test is self._current:
+            now = self._clock()
+            for stats, since in self._open_stats:
+                stats.update(wall=now[0] - since[0], cpu=now[1] - since[1],
+                             end=self._epoch + now[0])
+            self._current = None
+            self._open_stats = []
+            if self._profiler is not None:
+                self._add_profile(test.id(), now[0] - self._started[0], self._profiler)
+                self._profiler = None
+            unnotified, self._unnotified = self._unnotified, []
+            if unnotified:
+                unnotified[0][4].update(self._phases)
+                if self.memory:
+                    unnotified[0][4].update(self._memory_stats())
+                if self.detect_leaks:
+                    self._check_leaks(unnotified)
+            for item in unnotified:
+                self._notify(item)
 
     def addSuccess(self, test):
         if test not in self.subtestlist:
             self.success_count += 1
             TestResult.addSuccess(self, test)
             output = self.complete_output()
-            self.result.append((0, test, output, ''))
+            self._append((0, test, output, '', self._test_stats(test)))
             if self.verbosity > 1:
                 sys.stderr.write('ok ')
                 sys.stderr.write(str(test))
@@ -1196,7 +2392,7 @@ class _TestResult(TestResult):
         TestResult.addError(self, test, err)
         _, _exc_str = self.errors[-1]
         output = self.complete_output()
-        self.result.append((2, test, output, _exc_str))
+        self._append((2, test, output, _exc_str, self._test_stats(test)))
         if self.verbosity > 1:
             sys.stderr.write('E  ')
             sys.stderr.write(str(test))
@@ -1209,7 +2405,7 @@ class _TestResult(TestResult):
         TestResult.addFailure(self, test, err)
         _, _exc_str = self.failures[-1]
         output = self.complete_output()
-        self.result.append((1, test, output, _exc_str))
+        self._append((1, test, output, _exc_str, self._test_stats(test)))
         if self.verbosity > 1:
             sys.stderr.write('F  ')
             sys.stderr.write(str(test))
@@ -1221,7 +2417,7 @@ class _TestResult(TestResult):
         self.skip_count += 1
         TestResult.addSkip(self, test, reason)
         output = self.complete_output()
-        self.result.append((3, test, output, 'Skipped: ' + reason))
+        self._append((3, test, output, 'Skipped: ' + reason, self._test_stats(test)))
         if self.verbosity > 1:
             sys.stderr.write('SKIP ')
             sys.stderr.write(str(test))
@@ -1238,8 +2434,8 @@ class _TestResult(TestResult):
                 errors = self.failures
                 errors.append((subtest, self._exc_info_to_string(err, subtest)))
                 output = self.complete_output()
-                self.result.append((1, test, output + '\nSubTestCase Failed:\n' + str(subtest),
-                                    self._exc_info_to_string(err, subtest)))
+                self._append((1, test, output + '\nSubTestCase Failed:\n' + str(subtest),
+                                    self._exc_info_to_string(err, subtest), self._subtest_stats(subtest)))
                 if self.verbosity > 1:
                     sys.stderr.write('F  ')
                     sys.stderr.write(str(subtest))
@@ -1251,35 +2447,766 @@ class _TestResult(TestResult):
                 errors = self.errors
                 errors.append((subtest, self._exc_info_to_string(err, subtest)))
                 output = self.complete_output()
-                self.result.append(
-                    (2, test, output + '\nSubTestCase Error:\n' + str(subtest), self._exc_info_to_string(err, subtest)))
+                self._append(
+                    (2, test, output + '\nSubTestCase Error:\n' + str(subtest), self._exc_info_to_string(err, subtest),
+                     self._subtest_stats(subtest)))
                 if self.verbosity > 1:
                     sys.stderr.write('E  ')
                     sys.stderr.write(str(subtest))
                     sys.stderr.write('\n')
-        else:
+                else:
                     sys.stderr.write('E')
             self._mirrorOutput = True
         else:
-            self.subtestlist.append(subtest)
-            self.subtestlist.append(test)
+            self.subtestlist.add(test)
             self.success_count += 1
             output = self.complete_output()
-            self.result.append((0, test, output + '\nSubTestCase Pass:\n' + str(subtest), ''))
-        if self.verbosity > 1:
+            self._append((0, test, output + '\nSubTestCase Pass:\n' + str(subtest), '', self._subtest_stats(subtest)))
+            if self.verbosity > 1:
                 sys.stderr.write('ok ')
                 sys.stderr.write(str(subtest))
                 sys.stderr.write('\n')
+            else:
+                sys.stderr.write('S')
+
+
+    def add_fixture(self, kind, name, start):
+        """
+        Record a fixture (e.g. setUpClass of class ``name``) that ran from
+        _clock() reading ``start`` until now.
+        """
+        now = self._clock()
+        self._add_fixture(dict(kind=kind, name=name, start=self._epoch + start[0], end=self._epoch + now[0],
+                               wall=now[0] - start[0], cpu=now[1] - start[1], worker=self.worker))
+
+    def _add_fixture(self, fixture):
+        self.fixtures.append(fixture)
+        scope = 'module' if fixture['kind'].endswith('Module') else 'class'
+        total = self.fixture_totals.setdefault((scope, fixture['name']), [0.0, 0.0])
+        total[0] += fixture['wall']
+        total[1] += fixture['cpu']
+
+    def _add_profile(self, test_id, wall, profiler):
+        """ Merge the cProfile.Profile of a finished test into self.profile """
+        stats = pstats.Stats(profiler)
+        self.profile.add(stats)
+        if self.profile_slowest:
+            self._keep_profile((wall, test_id, stats.stats))
+
+    def _keep_profile(self, entry):
+        if len(self.profiles) < self.profile_slowest:
+            heapq.heappush(self.profiles, entry)
+        elif entry[0] > self.profiles[0][0]:
+            heapq.heapreplace(self.profiles, entry)
+
+    def pack(self, index):
+        """
+        Return a picklable snapshot of this result for shipping to another
+        process. Test objects are replaced by their position in ``index``
+        (a dict of id(test) -> position), subtests by the position of their
+        test, message and parameters; tests unknown to the index, such as
+        the _ErrorHolder unittest creates for failing class fixtures, are
+        shipped as-is.
+        """
+        def ref(test):
+            if isinstance(test, _SubTest) and id(test.test_case) in index:
+                message = None if test._message is _subtest_msg_sentinel else test._message
+                return index[id(test.test_case)], message, dict(test.params)
+            return index.get(id(test), test)
+
+        def refs(pairs):
+            return [(ref(t), s) for t, s in pairs]
+
+        return dict(
+            counts=(self.success_count, self.failure_count, self.error_count, self.skip_count),
+            testsRun=self.testsRun,
+            result=[(n, ref(t), o, e, stats) for n, t, o, e, stats in self.result],
+            failures=refs(self.failures),
+            errors=refs(self.errors),
+            skipped=refs(self.skipped),
+            expectedFailures=refs(self.expectedFailures),
+            unexpectedSuccesses=[ref(t) for t in self.unexpectedSuccesses],
+            fixtures=self.fixtures,
+            profile=self.profile.stats if self.profile is not None else None,
+            profiles=self.profiles,
+        )
+
+    def merge(self, packed, tests):
+        """
+        Fold a snapshot produced by pack() into this result. ``tests`` is the
+        list the snapshot's positions refer to.
+        """
+        def deref(ref):
+            if isinstance(ref, tuple):
+                i, message, params = ref
+                return _SubTest(tests[i], _subtest_msg_sentinel if message is None else message, params)
+            return tests[ref] if isinstance(ref, int) else ref
+
+        def derefs(pairs):
+            return [(deref(t), s) for t, s in pairs]
+
+        np, nf, ne, ns = packed['counts']
+        self.success_count += np
+        self.failure_count += nf
+        self.error_count += ne
+        self.skip_count += ns
+        self.testsRun += packed['testsRun']
+        # fixtures first: listeners rendering a class expect its fixtures
+        for fixture in packed['fixtures']:
+            self._add_fixture(fixture)
+        if packed['profile'] is not None:
+            self.profile.add(_profile_stats(packed['profile']))
+            for entry in packed['profiles']:
+                self._keep_profile(entry)
+        for n, t, o, e, stats in packed['result']:
+            self._append((n, deref(t), o, e, stats))
+        self.failures.extend(derefs(packed['failures']))
+        self.errors.extend(derefs(packed['errors']))
+        self.skipped.extend(derefs(packed['skipped']))
+        self.expectedFailures.extend(derefs(packed['expectedFailures']))
+        self.unexpectedSuccesses.extend(deref(t) for t in packed['unexpectedSuccesses'])
+
+
+def _file_name(test_id):
+    """ File name (without extension) for per-test files such as spilled output """
+    return ''.join(c if c.isalnum() or c in '._-' else '_' for c in test_id)
+
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _rss():
+    """ Resident set size of this process in bytes, None without /proc """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (IOError, OSError):
+        return None
+
+
+def _open_fds():
+    """ {fd: target} of the open file descriptors, None without /proc """
+    try:
+        fds = os.listdir('/proc/self/fd')
+    except OSError:
+        return None
+    targets = {}
+    for fd in fds:
+        try:
+            targets[fd] = os.readlink('/proc/self/fd/' + fd)
+        except OSError:
+            # e.g. the descriptor listdir() used, closed by now
+            pass
+    return targets
+
+
+def _child_pids():
+    """ Set of the pids of this process's children, None without /proc """
+    pids = set()
+    try:
+        for task in os.listdir('/proc/self/task'):
+            with open('/proc/self/task/%s/children' % task) as f:
+                pids.update(f.read().split())
+    except (IOError, OSError):
+        return None
+    return pids
+
+
+def _event_loop_resources(test):
+    """
+    Return (threads, fds) of the event loop an IsolatedAsyncioTestCase runs
+    on. unittest creates the loop after startTest and closes it after
+    stopTest, so they are not leaked by the test.
+    """
+    runner = getattr(test, '_asyncioRunner', None)
+    loop = getattr(runner, '_loop', None) or getattr(test, '_asyncioTestLoop', None)
+    if loop is None:
+        return set(), set()
+    fds = set()
+    selector = getattr(loop, '_selector', None)
+    if selector is not None:
+        fds.add(selector.fileno())
+    for name in ('_ssock', '_csock'):
+        sock = getattr(loop, name, None)
+        if sock is not None:
+            fds.add(sock.fileno())
+    executor = getattr(loop, '_default_executor', None)
+    threads = set(getattr(executor, '_threads', ()))
+    return threads, set(str(fd) for fd in fds)
+
+
+def _sample_resources(test=None):
+    """
+    Return (threads, fds, children) of this process for _resource_leaks(),
+    without the event loop of ``test`` if it has one.
+    """
+    threads, fds, children = set(threading.enumerate()), _open_fds(), _child_pids()
+    if test is not None:
+        loop_threads, loop_fds = _event_loop_resources(test)
+        threads -= loop_threads
+        if fds is not None:
+            for fd in loop_fds:
+                fds.pop(fd, None)
+    return threads, fds, children
+
+
+def _resource_leaks(before, after):
+    """ Describe the threads, fds and child processes in ``after`` only """
+    leaks = []
+    for thread in sorted(after[0] - before[0], key=lambda t: t.name):
+        leaks.append('thread %s' % thread.name)
+    if before[1] is not None and after[1] is not None:
+        for fd, target in sorted(after[1].items(), key=lambda item: int(item[0])):
+            if before[1].get(fd) != target:
+                leaks.append('fd %s -> %s' % (fd, target))
+    if before[2] is not None and after[2] is not None:
+        for pid in sorted(after[2] - before[2], key=int):
+            leaks.append('child process %s' % pid)
+    return leaks
+
+
+def _profile_stats(raw):
+    """ Return a pstats.Stats of a raw stats dict, e.g. one shipped from a worker """
+    stats = pstats.Stats()
+    stats.stats = raw
+    stats.get_top_level_stats()
+    return stats
+
+
+# ----------------------------------------------------------------------
+# Fixture timing
+
+
+class _TimedSuite(unittest.TestSuite):
+    """
+    A flat TestSuite that reports how long the class and module fixtures
+    take to results having add_fixture(). unittest runs fixtures from the
+    suite, outside startTest/stopTest, so _TestResult cannot time them.
+    Only fixtures the module or class defines are reported.
+    """
+
+    @staticmethod
+    def _module_defines(module, name):
+        return hasattr(sys.modules.get(module), name)
+
+    @staticmethod
+    def _class_defines(cls, name):
+        if getattr(cls, '__unittest_skip__', False):
+            return False
+        if name == 'tearDownClass' and getattr(cls, '_class_cleanups', None):
+            return True
+        return getattr(cls, name).__func__ is not getattr(unittest.TestCase, name).__func__
+
+    def _handleModuleFixture(self, test, result):
+        module = test.__class__.__module__
+        if module == self._get_previous_module(result):
+            return super(_TimedSuite, self)._handleModuleFixture(test, result)
+        # the tearDownModule of the previous module runs first and is timed
+        # on its own
+        self._teardown_end = start = _TestResult._clock()
+        super(_TimedSuite, self)._handleModuleFixture(test, result)
+        if hasattr(result, 'add_fixture') and self._module_defines(module, 'setUpModule'):
+            result.add_fixture('setUpModule', module, max(start, self._teardown_end))
+
+    def _handleModuleTearDown(self, result):
+        module = self._get_previous_module(result)
+        start = _TestResult._clock()
+        super(_TimedSuite, self)._handleModuleTearDown(result)
+        self._teardown_end = _TestResult._clock()
+        if module is not None and hasattr(result, 'add_fixture') and self._module_defines(module, 'tearDownModule'):
+            result.add_fixture('tearDownModule', module, start)
+
+    def _handleClassSetUp(self, test, result):
+        cls = test.__class__
+        if cls == getattr(result, '_previousTestClass', None):
+            return super(_TimedSuite, self)._handleClassSetUp(test, result)
+        start = _TestResult._clock()
+        super(_TimedSuite, self)._handleClassSetUp(test, result)
+        if hasattr(result, 'add_fixture') and self._class_defines(cls, 'setUpClass'):
+            result.add_fixture('setUpClass', '%s.%s' % (cls.__module__, cls.__name__), start)
+
+    def _tearDownPreviousClass(self, test, result):
+        cls = getattr(result, '_previousTestClass', None)
+        if cls is None or cls == test.__class__:
+            return super(_TimedSuite, self)._tearDownPreviousClass(test, result)
+        # checked first: tearDownClass runs the class cleanups
+        defined = self._class_defines(cls, 'tearDownClass')
+        start = _TestResult._clock()
+        super(_TimedSuite, self)._tearDownPreviousClass(test, result)
+        if hasattr(result, 'add_fixture') and defined:
+            result.add_fixture('tearDownClass', '%s.%s' % (cls.__module__, cls.__name__), start)
+
+
+# ----------------------------------------------------------------------
+# Parallel execution
+
+
+def _flatten_suite(suite):
+    """ Yield the individual test cases of a (possibly nested) suite """
+    for test in suite:
+        if isinstance(test, unittest.BaseTestSuite):
+            for t in _flatten_suite(test):
+                yield t
+        else:
+            yield test
+
+
+def _group_by_class(tests):
+    """
+    Group tests by class, preserving first-seen order. Classes are the unit
+    of distribution so setUpClass/setUpModule run once per worker instead of
+    once per test.
+    """
+    groups = {}
+    for i, t in enumerate(tests):
+        groups.setdefault(t.__class__, []).append(i)
+    return list(groups.values())
+
+
+def _group_for_workers(tests):
+    """
+    Group tests into the units handed out to pool workers: classes, except
+    that all classes of a module having setUpModule/tearDownModule form one
+    unit, so the module fixture still runs once and not alongside itself.
+    """
+    groups = {}
+    for i, t in enumerate(tests):
+        cls = t.__class__
+        module = sys.modules.get(cls.__module__)
+        shared = hasattr(module, 'setUpModule') or hasattr(module, 'tearDownModule')
+        groups.setdefault(cls.__module__ if shared else cls, []).append(i)
+    return list(groups.values())
+
+
+def _partition(groups, n, cost=len):
+    """
+    Split class groups into n chunks of roughly equal cost (by default the
+    test count): longest-processing-time-first, each group goes to the chunk
+    with the least cost so far. Ties keep suite order and pick the lowest
+    chunk, so the split is deterministic. Each chunk keeps suite order so
+    that module fixtures stay contiguous; chunks may be empty.
+    """
+    chunks = [[] for _ in range(n)]
+    loads = [0] * n
+    for group in sorted(groups, key=cost, reverse=True):
+        i = loads.index(min(loads))
+        chunks[i].extend(group)
+        loads[i] += cost(group)
+    return [sorted(c) for c in chunks]
+
+
+def _duration_cost(tests, durations):
+    """
+    Return a cost function for _partition and _schedule giving the expected
+    seconds of a group of test indexes. Tests without history count as the
+    mean known test duration, or 1 if nothing is known (i.e. by count).
+    """
+    known = [durations[t.id()] for t in tests if t.id() in durations]
+    default = sum(known) / len(known) if known else 1.0
+
+    def cost(group):
+        return sum(durations.get(tests[i].id(), default) for i in group)
+    return cost
+
+
+def shard_suite(suite, index, count, durations=None):
+    """
+    Return a suite with the tests of shard ``index`` (0 based) of ``count``.
+    Whole classes are distributed so fixtures are not repeated across
+    shards, balanced by ``durations`` ({test id: seconds} of a previous run)
+    when given. Every node computes the same partition for the same suite
+    and durations.
+    """
+    tests = list(_flatten_suite(suite))
+    cost = _duration_cost(tests, durations) if durations else len
+    chunks = _partition(_group_by_class(tests), count, cost)
+    return unittest.TestSuite([tests[i] for i in chunks[index]])
+
+
+# the flattened suite of the running parallel run: forked workers inherit
+# it and look their tests up by position
+_parallel_tests = None
+
+
+def _chunk_test(i, test):
+    """
+    Return the test of a chunk entry (position, test or test id). Worker
+    processes get ids, not TestCase instances, which need not be picklable
+    (e.g. IsolatedAsyncioTestCase): forked workers find the test in the
+    inherited _parallel_tests, others (forkserver, spawn) load it again.
+    """
+    if not isinstance(test, str):
+        return test
+    if _parallel_tests is not None:
+        return _parallel_tests[i]
+    return next(_flatten_suite(unittest.defaultTestLoader.loadTestsFromName(test)))
+
+
+def _run_chunk(args):
+    """
+    Worker entry point: run one chunk of tests and pack the outcome, with
+    the position of its first test and the seconds the worker was busy.
+    """
+    options, chunk = args
+    chunk = [(i, _chunk_test(i, t)) for i, t in chunk]
+    result = _TestResult(**options)
+    index = dict((id(t), i) for i, t in chunk)
+    start = time.perf_counter()
+    try:
+        with redirected_output():
+            _TimedSuite([t for _, t in chunk])(result)
+    finally:
+        result.stopTestRun()
+    packed = result.pack(index)
+    packed['position'] = chunk[0][0]
+    packed['busy'] = time.perf_counter() - start
+    return packed
+
+
+def _merge_in_order(packs, jobs, tests, result):
+    """
+    Merge the outcomes of the _run_chunk ``jobs``, yielded by ``packs`` in
+    any order, into ``result`` in suite order: a chunk waits until the
+    chunks before it are merged. Return the summed busy seconds of the
+    workers.
+    """
+    positions = sorted(chunk[0][0] for options, chunk in jobs)
+    waiting = {}
+    busy = 0.0
+    merged = 0
+    for packed in packs:
+        busy += packed['busy']
+        waiting[packed['position']] = packed
+        while merged < len(positions) and positions[merged] in waiting:
+            result.merge(waiting.pop(positions[merged]), tests)
+            merged += 1
+    return busy
+
+
+
+# ----------------------------------------------------------------------
+# Concurrent asyncio tests
+
+CONCURRENT_ATTR = '__htmltestrunner_concurrent__'
+
+
+def run_concurrently(obj):
+    """
+    Decorator marking an IsolatedAsyncioTestCase class or one of its test
+    methods as safe to run concurrently with other marked tests on a shared
+    event loop, when HTMLTestRunner is given async_concurrency.
+    """
+    setattr(obj, CONCURRENT_ATTR, True)
+    return obj
+
+
+def _is_concurrent(test):
+    """
+    Whether ``test`` is marked by run_concurrently. Tests of modules with
+    setUpModule/tearDownModule are not: their module fixture runs in the
+    regular suite.
+    """
+    if not isinstance(test, getattr(unittest, 'IsolatedAsyncioTestCase', ())):
+        return False
+    module = sys.modules.get(test.__class__.__module__)
+    if hasattr(module, 'setUpModule') or hasattr(module, 'tearDownModule'):
+        return False
+    method = getattr(test, test._testMethodName, None)
+    return getattr(test, CONCURRENT_ATTR, False) or getattr(method, CONCURRENT_ATTR, False)
+
+
+async def _call(test, func, *args, **kwargs):
+    """
+    Call a possibly async ``func`` of a test and await its result. As in
+    IsolatedAsyncioTestCase (Python 3.11+), the test's code runs in the
+    test's own context, where startTest directed the output to its buffer.
+    """
+    context = getattr(test, '_asyncioTestContext', None)
+    if context is None:
+        ret = func(*args, **kwargs)
+    else:
+        ret = context.run(func, *args, **kwargs)
+    if inspect.iscoroutine(ret) and context is not None:
+        ret = asyncio.get_running_loop().create_task(ret, context=context)
+    if inspect.isawaitable(ret):
+        await ret
+
+
+async def _run_async_test(test, result):
+    """
+    Run one IsolatedAsyncioTestCase test on the running event loop. This is
+    TestCase.run with the async parts awaited instead of run on a loop of
+    the test's own: an _Outcome records the outcome of setUp/asyncSetUp,
+    the test, asyncTearDown/tearDown and the cleanups, and of subTests.
+    """
+    result.startTest(test)
+    try:
+        method = getattr(test, test._testMethodName)
+        if getattr(test, '__unittest_skip__', False) or getattr(method, '__unittest_skip__', False):
+            reason = getattr(test, '__unittest_skip_why__', '') or getattr(method, '__unittest_skip_why__', '')
+            result.addSkip(test, reason)
+            return
+        expecting_failure = (getattr(test, '__unittest_expecting_failure__', False) or
+                             getattr(method, '__unittest_expecting_failure__', False))
+        outcome = _Outcome(result)
+        test._outcome = outcome
+        try:
+            clock = time.perf_counter()
+            with outcome.testPartExecutor(test):
+                await _call(test, test.setUp)
+                await _call(test, test.asyncSetUp)
+            result._phases['setup'] += time.perf_counter() - clock
+            if outcome.success:
+                outcome.expecting_failure = expecting_failure
+                with outcome.testPartExecutor(test):
+                    await _call(test, method)
+                outcome.expecting_failure = False
+                clock = time.perf_counter()
+                with outcome.testPartExecutor(test):
+                    await _call(test, test.asyncTearDown)
+                    await _call(test, test.tearDown)
+                result._phases['teardown'] += time.perf_counter() - clock
+            clock = time.perf_counter()
+            while test._cleanups:
+                func, args, kwargs = test._cleanups.pop()
+                with outcome.testPartExecutor(test):
+                    await _call(test, func, *args, **kwargs)
+            result._phases['teardown'] += time.perf_counter() - clock
+            if hasattr(test, '_feedErrorsToResult'):
+                # before Python 3.11 the outcome collects the errors
+                for skipped, reason in outcome.skipped:
+                    result.addSkip(skipped, reason)
+                test._feedErrorsToResult(result, outcome.errors)
+            if outcome.success:
+                if not expecting_failure:
+                    result.addSuccess(test)
+                elif outcome.expectedFailure:
+                    result.addExpectedFailure(test, outcome.expectedFailure)
+                else:
+                    result.addUnexpectedSuccess(test)
+        finally:
+            # break the cycle outcome.expectedFailure -> frame -> outcome
+            outcome.expectedFailure = None
+            test._outcome = None
+    finally:
+        result.stopTest(test)
+
+
+async def _run_in_slot(test, options, slots):
+    """ Run a test in its own _TestResult once one of the ``slots`` is free """
+    slot = await slots.get()
+    try:
+        result = _TestResult(**options)
+        # a timeline lane per slot
+        result.worker += ' asyncio-%d' % slot
+        await _run_async_test(test, result)
+        result.stopTestRun()
+        return result
+    finally:
+        slots.put_nowait(slot)
+
+
+def _class_fixture(cls, name, result):
+    """
+    Run the setUpClass or tearDownClass of ``cls`` like TestSuite does,
+    followed by the class cleanups when it is tearDownClass or setUpClass
+    failed, and report its errors to ``result``. Return whether it passed.
+    """
+    defined = _TimedSuite._class_defines(cls, name)
+    start = _TestResult._clock()
+    errors = []
+    try:
+        getattr(cls, name)()
+    except Exception:
+        errors.append(sys.exc_info())
+    if name == 'tearDownClass' or errors:
+        cls.doClassCleanups()
+        errors.extend(cls.tearDown_exceptions)
+    for exc_info in errors:
+        holder = _ErrorHolder('%s (%s)' % (name, strclass(cls)))
+        if issubclass(exc_info[0], unittest.SkipTest):
+            result.addSkip(holder, str(exc_info[1]))
         else:
-                sys.stderr.write('../HTTP_TestRunner')
+            result.addError(holder, exc_info)
+    if defined:
+        result.add_fixture(name, strclass(cls), start)
+    return not errors
+
+
+async def _run_concurrent_class(cls, tests, options, slots):
+    """
+    Run the tests of one class concurrently between its setUpClass and
+    tearDownClass. Return the _TestResults of the fixtures and tests.
+    """
+    skip = getattr(cls, '__unittest_skip__', False)
+    setup = _TestResult(**options)
+    if not skip and not _class_fixture(cls, 'setUpClass', setup):
+        return [setup]
+    results = await asyncio.gather(*[_run_in_slot(test, options, slots) for test in tests])
+    teardown = _TestResult(**options)
+    if not skip:
+        _class_fixture(cls, 'tearDownClass', teardown)
+    return [setup] + list(results) + [teardown]
+
+
+def _run_async_tests(tests, options, concurrency):
+    """
+    Run async ``tests`` on one new event loop, at most ``concurrency`` at a
+    time and their classes side by side. Return their _TestResults in
+    suite order.
+    """
+    async def run_all():
+        slots = asyncio.Queue()
+        for slot in range(concurrency):
+            slots.put_nowait(slot)
+        groups = _group_by_class(tests)
+        classes = await asyncio.gather(*[
+            _run_concurrent_class(tests[group[0]].__class__, [tests[i] for i in group], options, slots)
+            for group in groups])
+        return [result for results in classes for result in results]
+    return asyncio.run(run_all())
+
+
+# ----------------------------------------------------------------------
+# Streaming report
+
+
+class _StreamingReport(object):
+    """
+    Write the HTML report incrementally instead of building the whole page
+    in memory: the page head when the run starts, the rows of each class as
+    soon as the class finishes, and the totals, heading attributes and chart
+    at the end. Only the records of the running class are held with their
+    output: the result keeps the others without it (keep_output).
+
+    A class counts as finished when a record of another class arrives, so a
+    class whose tests are not contiguous in the suite shows up as several
+    groups in the report.
+    """
+
+    ATTRIBUTES_SCRIPT = """
+    <script type="text/javascript">
+    document.getElementById('stats-grid').innerHTML = %s;
+    </script>
+"""  # variables: (JSON string of the heading attributes)
+
+    # the panels are only known at the end: write them there and move them
+    # to their place below the chart
+    PANELS_TMPL = """
+    <div id='report-panels-late' class='panel-grid'>%s</div>
+    <script type="text/javascript">
+    document.getElementById('report-panels').replaceWith(document.getElementById('report-panels-late'));
+    </script>
+"""  # variables: (panels)
+
+    def __init__(self, runner, result):
+        self.runner = runner
+        self.result = result
+        self.html_head, self.html_tail = runner.HTML_TMPL.split('%(report)s')
+        self.report_head, self.report_tail = runner.REPORT_TMPL.split('%(test_list)s')
+        self.cls = None
+        self.records = []
+        self.cid = 0
+        self.wall = self.cpu = 0.0
+
+    def write(self, text):
+        self.runner.stream.write(text.encode('utf8'))
+
+    def begin(self):
+        runner = self.runner
+        self.write(self.html_head % dict(
+            title = saxutils.escape(runner.title),
+            generator = 'HTMLTestRunner %s' % __version__,
+            assets = runner._generate_assets(),
+            stylesheet = runner._generate_stylesheet(),
+            heading = runner._generate_heading([]),
+        ))
+        self.write(self.report_head % {})
+
+    def add_record(self, item):
+        cls = item[1].__class__
+        if cls is not self.cls:
+            self.flush()
+            self.cls = cls
+        self.records.append(item)
+
+    def flush(self):
+        if not self.records:
+            return
+        rows = []
+        wall, cpu = self.runner._generate_report_class(rows, self.cid, self.cls, self.records,
+                                                       self.result.fixture_totals)
+        self.write(''.join(rows))
+        if hasattr(self.runner.stream, 'flush'):
+            self.runner.stream.flush()
+        self.wall += wall
+        self.cpu += cpu
+        self.cid += 1
+        self.records = []
+
+    def end(self, result):
+        self.flush()
+        runner = self.runner
+        self.write(self.report_tail % runner._report_totals(result, self.wall, self.cpu))
+        attributes = runner._generate_heading_attributes(runner.getReportAttributes(result))
+        panels = runner._generate_panels(result)
+        self.write(self.html_tail % dict(
+            ending = runner._generate_ending(),
+            chart_script = runner._generate_chart(result) +
+                self.ATTRIBUTES_SCRIPT % json.dumps(attributes).replace('</', '<\\/') +
+                (self.PANELS_TMPL % panels if panels else ''),
+        ))
 
 
 class HTMLTestRunner(Template_mixin):
 
-    def __init__(self, stream=sys.stdout, verbosity=1, title=None, description=None, tester=None, open_in_browser=False):
+    def __init__(self, stream=sys.stdout, verbosity=1, title=None, description=None, tester=None, open_in_browser=False,
+                 workers=1, streaming=False, output_limit=None, output_dir=None, report_mode='html',
+                 inline_assets=False, jsonl_file=None, junit_file=None, history_file=None, profile=False,
+                 profile_slowest=0, memory=False, detect_leaks=False, fail_on_leaks=False, thread_workers=1,
+                 async_concurrency=0, start_method=None):
         self.stream = stream
         self.verbosity = verbosity
         self.open_in_browser = open_in_browser
+        if workers > 1 and thread_workers > 1:
+            raise ValueError('workers and thread_workers cannot be combined')
+        if fail_on_leaks and (thread_workers > 1 or async_concurrency):
+            # resources are sampled for the whole process: a test would be
+            # blamed for those of the tests running alongside it
+            raise ValueError('fail_on_leaks cannot be combined with thread_workers or async_concurrency')
+        if (profile or profile_slowest) and (thread_workers > 1 or async_concurrency):
+            # cProfile is one per thread on Python 3.12+ (a second one
+            # raises) and profiles every task of the event loop at once
+            raise ValueError('profile cannot be combined with thread_workers or async_concurrency')
+        self.workers = workers
+        self.thread_workers = thread_workers
+        self.async_concurrency = async_concurrency
+        self.start_method = start_method
+        self.streaming = streaming
+        self.output_limit = output_limit
+        self.output_dir = output_dir
+        if report_mode not in self.REPORT_MODES:
+            raise ValueError('report_mode must be one of %s' % ', '.join(self.REPORT_MODES))
+        self.report_mode = report_mode
+        self.inline_assets = inline_assets
+        self.jsonl_file = jsonl_file
+        self.junit_file = junit_file
+        self.history_file = history_file
+        self.profile = profile
+        self.profile_slowest = profile_slowest
+        self.memory = memory
+        self.detect_leaks = detect_leaks
+        self.fail_on_leaks = fail_on_leaks
+        # (test id, path) of the written .prof files, slowest first
+        self.profile_files = []
+        self.run_id = None
+        # slow tests found against the history (None: no history store)
+        self.regressions = None
+        # (busy fraction, pool size) of the workers (None: no pool)
+        self.utilization = None
+        if inline_assets:
+            # fail before running the tests if the vendor files are missing
+            self._generate_assets()
         if title is None:
             self.title = self.DEFAULT_TITLE
         else:
@@ -1287,20 +3214,69 @@ class HTMLTestRunner(Template_mixin):
         if description is None:
             self.description = self.DEFAULT_DESCRIPTION
         else:
-        self.description = description
+            self.description = description
         if tester is None:
             self.tester = "QA Team"
         else:
-        self.tester = tester
+            self.tester = tester
 
         self.startTime = datetime.datetime.now()
         
     def run(self, test):
         "Run the given test case or test suite."
-        result = _TestResult(self.verbosity)
-        test(result)
+        if (self.output_limit or self.profile_slowest) and self.output_dir and not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        result = _TestResult(**self._result_options())
+        writer = None
+        if self.streaming:
+            writer = _StreamingReport(self, result)
+            result.listeners.append(writer)
+            result.keep_output = False
+            writer.begin()
+        exporters = []
+        if self.jsonl_file:
+            exporters.append(JSONLWriter(self.jsonl_file))
+        if self.junit_file:
+            exporters.append(JUnitXMLWriter(self.junit_file))
+        result.listeners.extend(exporters)
+        concurrent_tests = []
+        if self.async_concurrency and isinstance(test, unittest.TestSuite):
+            tests = list(_flatten_suite(test))
+            concurrent_tests = [t for t in tests if _is_concurrent(t)]
+            if concurrent_tests:
+                test = unittest.TestSuite([t for t in tests if not _is_concurrent(t)])
+        try:
+            with redirected_output():
+                if concurrent_tests:
+                    self._run_concurrent(concurrent_tests, result)
+                if self.workers > 1:
+                    self._run_parallel(test, result)
+                elif self.thread_workers > 1:
+                    self._run_threaded(test, result)
+                elif isinstance(test, unittest.TestSuite):
+                    _TimedSuite(_flatten_suite(test))(result)
+                else:
+                    test(result)
+        finally:
+            result.stopTestRun()
+            for exporter in exporters:
+                exporter.close()
         self.stopTime = datetime.datetime.now()
-        self.generateReport(test, result)
+        if result.profiles:
+            self.profile_files = self._write_profiles(result)
+        if self.history_file:
+            with HistoryStore(self.history_file) as store:
+                self.run_id = store.add_run(str(self.startTime), (self.stopTime - self.startTime).total_seconds(),
+                                            result.result, self.title)
+                current = dict((test_id, wall) for test_id, (status, wall, cpu)
+                               in test_totals(result.result).items() if status in (0, 1))
+                self.regressions = find_regressions(
+                    store.samples(self.REGRESSION_BASELINE_RUNS, before=self.run_id), current,
+                    ratio=self.REGRESSION_RATIO, min_delta=self.REGRESSION_MIN_DELTA)
+        if writer:
+            writer.end(result)
+        else:
+            self.generateReport(test, result)
         print('\nTime 运行时长: %s' % (self.stopTime-self.startTime), file=sys.stderr)
         
         # 自动打开报告
@@ -1311,17 +3287,137 @@ class HTMLTestRunner(Template_mixin):
         
         return result
 
+    def _result_options(self):
+        """ Keyword arguments of the _TestResult of a run (or of a worker) """
+        return dict(
+            verbosity=self.verbosity,
+            output_limit=self.output_limit,
+            output_dir=self.output_dir,
+            profile=self.profile,
+            profile_slowest=self.profile_slowest,
+            memory=self.memory,
+            detect_leaks=self.detect_leaks,
+            fail_on_leaks=self.fail_on_leaks,
+        )
+
+    def _write_profiles(self, result):
+        """
+        Write the profiles of the slowest tests as .prof files (readable by
+        pstats, snakeviz, ...) to output_dir, or the current directory.
+        Return [(test id, path)], slowest first.
+        """
+        files = []
+        for wall, test_id, raw in sorted(result.profiles, reverse=True):
+            path = os.path.join(self.output_dir or os.curdir, _file_name(test_id) + '.prof')
+            with open(path, 'wb') as f:
+                marshal.dump(raw, f)
+            files.append((test_id, path))
+        return files
+
+    def _schedule(self, tests):
+        """
+        Return the _run_chunk jobs of the flattened suite, one per class (or
+        module with module fixtures), longest expected first: workers take
+        the next job from the shared queue as soon as they are idle, so the
+        slow classes start early and the short ones fill the gaps at the
+        end. Expected durations are the medians of the history store; tests
+        without history count as the mean known duration.
+        """
+        durations = {}
+        if self.history_file:
+            with HistoryStore(self.history_file) as store:
+                durations = store.durations()
+        cost = _duration_cost(tests, durations)
+        options = self._result_options()
+        groups = sorted(_group_for_workers(tests), key=cost, reverse=True)
+        return [(options, [(i, tests[i]) for i in group]) for group in groups]
+
+    def _run_parallel(self, test, result):
+        """
+        Run the flattened suite in a process pool of self.workers processes
+        fed by _schedule() and merge each job's outcome back into
+        ``result``.
+        """
+        global _parallel_tests
+        tests = list(_flatten_suite(test))
+        jobs = [(options, [(i, t.id()) for i, t in chunk]) for options, chunk in self._schedule(tests)]
+        if not jobs:
+            return
+        size = min(self.workers, len(jobs))
+        start = time.perf_counter()
+        _parallel_tests = tests
+        try:
+            with self._pool_context(tests).Pool(size) as pool:
+                busy = _merge_in_order(pool.imap_unordered(_run_chunk, jobs), jobs, tests, result)
+        finally:
+            _parallel_tests = None
+        self.utilization = (busy / ((time.perf_counter() - start) * size), size)
+
+    def _pool_context(self, tests):
+        """
+        Return the multiprocessing context of the worker pool. Workers should
+        start warm, with the test modules already imported:
+        - with fork, the parent that loaded the suite is that warm process;
+        - otherwise a forkserver imports the runner and the test modules once,
+          like a zygote, and every worker is a fork of it instead of a fresh
+          interpreter importing them again. This also replaces a spawn
+          default (macOS) when forkserver is available.
+        """
+        method = self.start_method
+        if method is None:
+            method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+            if method == 'spawn' and 'forkserver' in multiprocessing.get_all_start_methods():
+                method = 'forkserver'
+        context = multiprocessing.get_context(method)
+        if method == 'forkserver':
+            # only takes effect when the forkserver starts, i.e. on the first
+            # parallel run of the process
+            modules = sorted(set(t.__class__.__module__ for t in tests))
+            context.set_forkserver_preload([__name__] + modules)
+        return context
+
+    def _run_threaded(self, test, result):
+        """
+        Run the classes of the flattened suite concurrently in a pool of
+        self.thread_workers threads fed by _schedule(), each class with its
+        own _TestResult merged back into ``result`` in suite order. Meant
+        for I/O bound tests: the GIL still serializes Python code.
+        """
+        tests = list(_flatten_suite(test))
+        jobs = self._schedule(tests)
+        if not jobs:
+            return
+        size = min(self.thread_workers, len(jobs))
+        start = time.perf_counter()
+        # the redirectors are installed by run(): swapping sys.stdout per
+        # test is not safe with tests running side by side
+        with concurrent.futures.ThreadPoolExecutor(size, thread_name_prefix='worker') as pool:
+            futures = [pool.submit(_run_chunk, job) for job in jobs]
+            packs = (f.result() for f in concurrent.futures.as_completed(futures))
+            busy = _merge_in_order(packs, jobs, tests, result)
+        self.utilization = (busy / ((time.perf_counter() - start) * size), size)
+
+    def _run_concurrent(self, tests, result):
+        """
+        Run the async tests marked by run_concurrently side by side on one
+        event loop (at most self.async_concurrency at a time), each in its
+        own _TestResult merged back into ``result`` in suite order.
+        """
+        index = dict((id(t), i) for i, t in enumerate(tests))
+        for test_result in _run_async_tests(tests, self._result_options(), self.async_concurrency):
+            result.merge(test_result.pack(index), tests)
+
     def sortResult(self, result_list):
         # unittest does not seems to run in any particular order.
         # Here at least we want to group them together by class.
         rmap = {}
         classes = []
-        for n,t,o,e in result_list:
-            cls = t.__class__
+        for item in result_list:
+            cls = item[1].__class__
             if cls not in rmap:
                 rmap[cls] = []
                 classes.append(cls)
-            rmap[cls].append((n,t,o,e))
+            rmap[cls].append(item)
         r = [(cls, rmap[cls]) for cls in classes]
         return r
 
@@ -1341,24 +3437,30 @@ class HTMLTestRunner(Template_mixin):
             status = ' '.join(status)
         else:
             status = 'none'
-        return [
+        attrs = [
             (u'开始时间', startTime),
             (u'运行时长', duration),
             (u'状态', status),
             (u'测试人', self.tester),
         ]
+        if self.utilization is not None:
+            busy, size = self.utilization
+            unit = u'进程' if self.workers > 1 else u'线程'
+            attrs.append((u'并行效率', u'%.0f%% (%d %s)' % (min(busy, 1.0) * 100, size, unit)))
+        return attrs
 
     def generateReport(self, test, result):
         report_attrs = self.getReportAttributes(result)
         generator = 'HTMLTestRunner %s' % __version__
         stylesheet = self._generate_stylesheet()
-        heading = self._generate_heading(report_attrs)
+        heading = self._generate_heading(report_attrs, self._generate_panels(result))
         report = self._generate_report(result)
         ending = self._generate_ending()
         chart = self._generate_chart(result)
         output = self.HTML_TMPL % dict(
             title = saxutils.escape(self.title),
             generator = generator,
+            assets = self._generate_assets(),
             stylesheet = stylesheet,
             heading = heading,
             report = report,
@@ -1370,7 +3472,239 @@ class HTMLTestRunner(Template_mixin):
     def _generate_stylesheet(self):
         return self.STYLESHEET_TMPL
 
-    def _generate_heading(self, report_attrs):
+    def _generate_assets(self):
+        if not self.inline_assets:
+            return self.ASSETS_TMPL
+        return assets.inline_block(self._used_icons())
+
+    def _used_icons(self):
+        """
+        The icon names the report can use, to tree-shake the icon font
+        stylesheet to: those in the source of the report classes, which
+        also covers icons chosen in code rather than in the templates.
+        None (keep every icon) if a source file cannot be read.
+        """
+        used = set()
+        for cls in type(self).__mro__[:-1]:
+            path = getattr(sys.modules.get(cls.__module__), '__file__', None)
+            if not path or not path.endswith('.py'):
+                return None
+            try:
+                with io.open(path, encoding='utf-8') as f:
+                    used.update(re.findall(r'\bbi-([a-z0-9-]+)', f.read()))
+            except (IOError, OSError):
+                return None
+        return frozenset(used)
+
+    def _generate_heading(self, report_attrs, panels=''):
+        heading = self.HEADING_TMPL % dict(
+            title = saxutils.escape(self.title),
+            parameters = self._generate_heading_attributes(report_attrs),
+            description = saxutils.escape(self.description),
+            panels = panels,
+        )
+        return heading
+
+    def _generate_panels(self, result):
+        """ HTML of the analysis panels below the chart """
+        panels = []
+        if self.regressions is not None:
+            panels.append(self._generate_regression_panel())
+        if result.result:
+            panels.extend(self._generate_duration_panels(result))
+        if result.fixture_totals:
+            panels.append(self._generate_fixture_panel(result))
+        if result.profile is not None and result.profile.stats:
+            panels.append(self._generate_profile_panel(result))
+        if result.result:
+            panels.extend(self._generate_memory_panels(result))
+        if self.detect_leaks or self.fail_on_leaks:
+            panels.append(self._generate_leak_panel(result))
+        if result.result:
+            panels.append(self._generate_timeline_panel(result))
+        return ''.join(panels)
+
+    def _duration_profile(self, result):
+        """
+        One pass over the records: return the total (wall, cpu) per test id
+        (subtests summed) and per class, keeping one test object per id.
+        """
+        tests = {}
+        classes = {}
+        for n, t, o, e, stats in result.result:
+            wall, cpu = stats['wall'], stats['cpu']
+            entry = tests.get(t.id())
+            if entry is None:
+                tests[t.id()] = [t, wall, cpu]
+            else:
+                entry[1] += wall
+                entry[2] += cpu
+            entry = classes.setdefault(t.__class__, [0.0, 0.0])
+            entry[0] += wall
+            entry[1] += cpu
+        return tests, classes
+
+    def _generate_duration_panels(self, result):
+        """ The slowest tests and classes tables and the duration histogram """
+        tests, classes = self._duration_profile(result)
+        counts = [0] * len(self.HISTOGRAM_LABELS)
+        for t, wall, cpu in tests.values():
+            counts[bisect.bisect_right(self.HISTOGRAM_BOUNDS, wall)] += 1
+
+        slowest_tests = heapq.nlargest(self.SLOWEST_COUNT, tests.values(), key=lambda entry: entry[1])
+        rows = [self.SLOWEST_ROW_TMPL % dict(
+            rank = i + 1,
+            name = saxutils.escape(t.id()),
+            wall = self._format_duration(wall),
+            cpu = self._format_duration(cpu),
+        ) for i, (t, wall, cpu) in enumerate(slowest_tests)]
+        tests_panel = self._generate_panel('bi bi-hourglass-split', u'最慢用例 Top %d' % self.SLOWEST_COUNT,
+                                           self.SLOWEST_TABLE_TMPL % dict(name=u'测试用例', rows=''.join(rows)))
+
+        slowest_classes = heapq.nlargest(self.SLOWEST_COUNT, classes.items(), key=lambda item: item[1][0])
+        rows = [self.SLOWEST_ROW_TMPL % dict(
+            rank = i + 1,
+            name = saxutils.escape(self._generate_class_name(cls)),
+            wall = self._format_duration(wall),
+            cpu = self._format_duration(cpu),
+        ) for i, (cls, (wall, cpu)) in enumerate(slowest_classes)]
+        classes_panel = self._generate_panel('bi bi-folder-symlink', u'最慢测试类 Top %d' % self.SLOWEST_COUNT,
+                                             self.SLOWEST_TABLE_TMPL % dict(name=u'测试类', rows=''.join(rows)))
+
+        histogram_panel = self._generate_panel('bi bi-bar-chart-line', u'耗时分布', self.HISTOGRAM_TMPL % dict(
+            labels = self._dump_json(list(self.HISTOGRAM_LABELS)),
+            counts = self._dump_json(counts),
+        ))
+        return [tests_panel, classes_panel, histogram_panel]
+
+    def _generate_fixture_panel(self, result):
+        """ The modules and classes whose setUp*/tearDown* fixtures took longest """
+        slowest = heapq.nlargest(self.SLOWEST_COUNT, result.fixture_totals.items(), key=lambda item: item[1][0])
+        rows = [self.SLOWEST_ROW_TMPL % dict(
+            rank = i + 1,
+            name = saxutils.escape(u'%s %s' % (self.FIXTURE_SCOPES[scope], name)),
+            wall = self._format_duration(wall),
+            cpu = self._format_duration(cpu),
+        ) for i, ((scope, name), (wall, cpu)) in enumerate(slowest)]
+        return self._generate_panel('bi bi-gear', u'最慢夹具 Top %d' % self.SLOWEST_COUNT,
+                                    self.SLOWEST_TABLE_TMPL % dict(name=u'模块/测试类', rows=''.join(rows)))
+
+    def _generate_memory_panels(self, result):
+        """ The tests allocating the most memory and growing the RSS most (memory=True) """
+        tests = [(t, stats) for n, t, o, e, stats in result.result if 'mem_delta' in stats]
+        if not tests:
+            return []
+        panels = []
+        for key, icon, title in self.MEMORY_PANELS:
+            if key not in tests[0][1]:
+                continue
+            largest = heapq.nlargest(self.SLOWEST_COUNT, tests, key=lambda test: test[1][key])
+            rows = [self.MEMORY_ROW_TMPL % dict(
+                rank = i + 1,
+                name = saxutils.escape(t.id()),
+                peak = self._format_bytes(stats['mem_peak']) if 'mem_peak' in stats else '-',
+                delta = self._format_bytes(stats['mem_delta']),
+                rss = self._format_bytes(stats['rss_delta']) if 'rss_delta' in stats else '-',
+            ) for i, (t, stats) in enumerate(largest)]
+            panels.append(self._generate_panel(icon, title % self.SLOWEST_COUNT,
+                                               self.MEMORY_TABLE_TMPL % dict(rows=''.join(rows))))
+        return panels
+
+    def _generate_leak_panel(self, result):
+        """ The tests that left threads, file descriptors or child processes behind """
+        rows = [self.LEAK_ROW_TMPL % dict(
+            name = saxutils.escape(t.id()),
+            leaks = '<br>'.join(saxutils.escape(leak) for leak in stats['leaks']),
+        ) for n, t, o, e, stats in result.result if stats.get('leaks')]
+        if rows:
+            body = self.LEAK_TABLE_TMPL % dict(rows=''.join(rows))
+        else:
+            body = self.PANEL_NOTE_TMPL % dict(note=u'没有用例遗留线程、文件描述符或子进程')
+        return self._generate_panel('bi bi-droplet-half', u'资源泄漏 (%d)' % len(rows), body)
+
+    def _generate_profile_panel(self, result):
+        """ The functions with the most own time over all profiled tests, and the .prof files """
+        hottest = heapq.nlargest(self.SLOWEST_COUNT, result.profile.stats.items(), key=lambda item: item[1][2])
+        rows = [self.HOT_FUNCTION_ROW_TMPL % dict(
+            rank = i + 1,
+            function = saxutils.escape(pstats.func_std_string(func)),
+            calls = nc if nc == cc else '%d/%d' % (nc, cc),
+            tottime = self._format_duration(tt),
+            cumtime = self._format_duration(ct),
+        ) for i, (func, (cc, nc, tt, ct, callers)) in enumerate(hottest)]
+        links = [self.PROFILE_LINK_TMPL % dict(
+            href = saxutils.escape(self._relative_href(path), {'"': '&quot;'}),
+            name = saxutils.escape(test_id),
+        ) for test_id, path in self.profile_files]
+        body = self.HOT_FUNCTION_TABLE_TMPL % dict(rows=''.join(rows))
+        if links:
+            body += self.PROFILE_FILES_TMPL % dict(links=''.join(links))
+        return self._generate_panel('bi bi-fire', u'热点函数 Top %d' % self.SLOWEST_COUNT, body, wide=True)
+
+    def _generate_timeline_panel(self, result):
+        """
+        Gantt chart of the run: a lane per worker process with a bar per
+        test (its subtests merged) and per class or module fixture.
+        """
+        spans = {}
+        for n, t, o, e, stats in result.result:
+            if 'start' not in stats:
+                # e.g. the _ErrorHolder of a failing setUpClass, shown as
+                # the fixture's bar
+                continue
+            key = t.id(), stats['worker']
+            span = spans.get(key)
+            if span is None:
+                spans[key] = [stats['worker'], stats['start'], stats['end'], n, t.id()]
+            else:
+                span[1] = min(span[1], stats['start'])
+                span[2] = max(span[2], stats['end'])
+                span[3] = max(span[3], n, key=self.TIMELINE_SEVERITY.index)
+        fixture_kind = len(self.STATUS)
+        bars = list(spans.values()) + [[f['worker'], f['start'], f['end'], fixture_kind,
+                                        '%s: %s' % (f['kind'], f['name'])] for f in result.fixtures]
+        if not bars:
+            return ''
+        note = u'共 %d 个时间段' % len(bars)
+        if len(bars) > self.TIMELINE_MAX_BARS:
+            note += u'，仅显示耗时最长的 %d 个' % self.TIMELINE_MAX_BARS
+            bars = heapq.nlargest(self.TIMELINE_MAX_BARS, bars, key=lambda bar: bar[2] - bar[1])
+
+        origin = min(bar[1] for bar in bars)
+        lanes = {}
+        for bar in sorted(bars, key=lambda bar: bar[1]):
+            lanes.setdefault(bar[0], len(lanes))
+        data = [[lanes[worker], round(start - origin, 4), round(end - origin, 4), kind, i]
+                for i, (worker, start, end, kind, name) in enumerate(bars)]
+        return self._generate_panel('bi bi-bar-chart-steps', u'执行时间线', self.TIMELINE_TMPL % dict(
+            note = note,
+            height = 120 + 40 * len(lanes),
+            kinds = self._dump_json([self.STATUS[n] for n in sorted(self.STATUS)] + [u'夹具']),
+            names = self._dump_json([bar[4] for bar in bars]),
+            bars = self._dump_json(data),
+            lanes = self._dump_json(sorted(lanes, key=lanes.get)),
+        ), wide=True)
+
+    def _generate_panel(self, icon, title, body, wide=False):
+        return self.PANEL_TMPL % dict(extra_class=' panel-wide' if wide else '', icon=icon,
+                                      title=saxutils.escape(title), body=body)
+
+    def _generate_regression_panel(self):
+        note = u'耗时达到最近 %d 次运行中位数的 %.1f 倍以上、增加超过 %.2f 秒且显著超出历史波动的用例' % (
+            self.REGRESSION_BASELINE_RUNS, self.REGRESSION_RATIO, self.REGRESSION_MIN_DELTA)
+        if not self.regressions:
+            body = self.PANEL_NOTE_TMPL % dict(note=note + u'：无')
+        else:
+            rows = [self.REGRESSION_ROW_TMPL % dict(
+                test_id = saxutils.escape(r['test_id']),
+                baseline = self._format_duration(r['baseline']),
+                current = self._format_duration(r['current']),
+                ratio = u'×%.1f' % r['ratio'],
+            ) for r in self.regressions]
+            body = self.REGRESSION_TABLE_TMPL % dict(note=note, rows=''.join(rows))
+        return self._generate_panel('bi bi-graph-up-arrow', u'性能退化 (%d)' % len(self.regressions), body)
+
+    def _generate_heading_attributes(self, report_attrs):
         a_lines = []
         # 为每个属性定义图标和卡片样式
         attr_config = {
@@ -1378,6 +3712,7 @@ class HTMLTestRunner(Template_mixin):
             u'运行时长': {'icon': 'bi bi-stopwatch', 'class': 'primary'},
             u'状态': {'icon': 'bi bi-flag-fill', 'class': 'success'},
             u'测试人': {'icon': 'bi bi-person-fill', 'class': 'secondary'},
+            u'并行效率': {'icon': 'bi bi-cpu', 'class': 'primary'},
         }
         
         for name, value in report_attrs:
@@ -1389,57 +3724,122 @@ class HTMLTestRunner(Template_mixin):
                 icon = config['icon'],
             )
             a_lines.append(line)
-        heading = self.HEADING_TMPL % dict(
-            title = saxutils.escape(self.title),
-            parameters = ''.join(a_lines),
-            description = saxutils.escape(self.description),
-        )
-        return heading
+        return ''.join(a_lines)
 
     def _generate_report(self, result):
         rows = []
+        total_wall = total_cpu = 0.0
         sortedResult = self.sortResult(result.result)
         for cid, (cls, cls_results) in enumerate(sortedResult):
-            # subtotal for a class
-            np = nf = ne = ns = 0
-            for n,t,o,e in cls_results:
-                if n == 0: np += 1
-                elif n == 1: nf += 1
-                elif n == 2: ne += 1
-                else: ns += 1
-            
-            # format class description
-            if cls.__module__ == "__main__":
-                name = cls.__name__
-            else:
-                name = "%s.%s" % (cls.__module__, cls.__name__)
-            doc = cls.__doc__ and cls.__doc__.split("\n")[0] or ""
-            desc = doc and '%s: %s' % (name, doc) or name
-
-            row = self.REPORT_CLASS_TMPL % dict(
-                style = ne > 0 and 'errorClass' or nf > 0 and 'failClass' or ns > 0 and 'skipClass' or 'passClass',
-                desc = desc,
-                count = np+nf+ne+ns,
-                Pass = np,
-                fail = nf,
-                error = ne,
-                skip = ns,
-                cid = 'c%s' % (cid+1),
-            )
-            rows.append(row)
-
-            for tid, (n,t,o,e) in enumerate(cls_results):
-                self._generate_report_test(rows, cid, tid, n, t, o, e)
+            wall, cpu = self._generate_report_class(rows, cid, cls, cls_results, result.fixture_totals)
+            total_wall += wall
+            total_cpu += cpu
 
         report = self.REPORT_TMPL % dict(
+            self._report_totals(result, total_wall, total_cpu),
             test_list = ''.join(rows),
+        )
+        return report
+
+    def _report_totals(self, result, wall, cpu):
+        """ Return the variables of the total row in REPORT_TMPL """
+        return dict(
             count = str(result.success_count+result.failure_count+result.error_count+result.skip_count),
             Pass = str(result.success_count),
             fail = str(result.failure_count),
             error = str(result.error_count),
             skip = str(result.skip_count),
+            wall = self._format_duration(wall),
+            cpu = self._format_duration(cpu),
         )
-        return report
+
+    def _generate_report_class(self, rows, cid, cls, cls_results, fixtures=None):
+        """
+        Append the rows of one class and its tests to ``rows``.
+        ``fixtures`` are the fixture_totals of the result.
+        Return the class's total (wall, cpu) seconds.
+        """
+        # subtotal for a class
+        np = nf = ne = ns = 0
+        wall = cpu = test_fixtures = 0.0
+        for n,t,o,e,stats in cls_results:
+            if n == 0: np += 1
+            elif n == 1: nf += 1
+            elif n == 2: ne += 1
+            else: ns += 1
+            wall += stats['wall']
+            cpu += stats['cpu']
+            test_fixtures += stats.get('setup', 0.0) + stats.get('teardown', 0.0)
+        class_fixtures = (fixtures or {}).get(('class', '%s.%s' % (cls.__module__, cls.__name__)), (0.0,))[0]
+
+        # format class description
+        name = self._generate_class_name(cls)
+        doc = cls.__doc__ and cls.__doc__.split("\n")[0] or ""
+        desc = doc and '%s: %s' % (name, doc) or name
+
+        row = self.REPORT_CLASS_TMPL % dict(
+            style = ne > 0 and 'errorClass' or nf > 0 and 'failClass' or ns > 0 and 'skipClass' or 'passClass',
+            desc = desc,
+            fixtures = self._generate_class_fixtures(class_fixtures, test_fixtures),
+            count = np+nf+ne+ns,
+            Pass = np,
+            fail = nf,
+            error = ne,
+            skip = ns,
+            wall = self._format_duration(wall),
+            cpu = self._format_duration(cpu),
+            cid = 'c%s' % (cid+1),
+        )
+        if self.report_mode == 'virtual':
+            self._generate_report_class_data(rows, cid, cls_results, row)
+        elif self.report_mode == 'json':
+            rows.append(row)
+            self._generate_report_class_data(rows, cid, cls_results)
+        else:
+            rows.append(row)
+            for tid, (n,t,o,e,stats) in enumerate(cls_results):
+                self._generate_report_test(rows, cid, tid, n, t, o, e, stats)
+        return wall, cpu
+
+    def _generate_class_fixtures(self, class_fixtures, test_fixtures):
+        """ The fixture line of a class row, omitted when it would read all zeros """
+        if class_fixtures + test_fixtures < 0.0005:
+            return ''
+        if self.report_mode == 'virtual':
+            tmpl = self.REPORT_CLASS_FIXTURES_INLINE_TMPL
+        else:
+            tmpl = self.REPORT_CLASS_FIXTURES_TMPL
+        return tmpl % dict(
+            cls = self._format_duration(class_fixtures),
+            test = self._format_duration(test_fixtures),
+        )
+
+    def _generate_report_class_data(self, rows, cid, cls_results, class_row=None):
+        """
+        Append the JSON data island of a class's tests (report_mode='json'),
+        in 'virtual' mode along with the class row itself.
+        """
+        data = dict(n=[], desc=[], out=[], wall=[], cpu=[], link={})
+        if class_row is not None:
+            data['row'] = class_row.strip()
+        for tid, (n,t,o,e,stats) in enumerate(cls_results):
+            data['n'].append(n)
+            data['desc'].append(self._generate_test_desc(t))
+            data['out'].append(o+e)
+            data['wall'].append(round(stats['wall'], 6))
+            data['cpu'].append(round(stats['cpu'], 6))
+            href = self._output_href(stats)
+            if href:
+                data['link'][tid] = href
+        rows.append(self.REPORT_CLASS_DATA_TMPL % dict(
+            cid = 'c%s' % (cid+1),
+            data = self._dump_json(data),
+        ))
+
+    @staticmethod
+    def _dump_json(obj):
+        """ Compact JSON that is safe to embed in a <script> element """
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).replace('<', '\\u003c')
 
     def _generate_chart(self, result):
         chart = self.ECHARTS_SCRIPT % dict(
@@ -1450,7 +3850,17 @@ class HTMLTestRunner(Template_mixin):
         )
         return chart
 
-    def _generate_report_test(self, rows, cid, tid, n, t, o, e):
+    @staticmethod
+    def _format_duration(seconds):
+        return '%.3f' % seconds
+
+    @staticmethod
+    def _format_bytes(n):
+        if abs(n) < 1024 * 1024:
+            return '%.1f KB' % (n / 1024.0)
+        return '%.1f MB' % (n / 1024.0 / 1024)
+
+    def _generate_report_test(self, rows, cid, tid, n, t, o, e, stats=None):
         # e.g. 'pt1.1', 'ft1.1', 'st1.1', etc
         # n == 0: pass, 1: fail, 2: error, 3: skip
         if n == 0:
@@ -1460,9 +3870,7 @@ class HTMLTestRunner(Template_mixin):
         else:
             prefix = 'f'
         tid = prefix + 't%s.%s' % (cid+1,tid+1)
-        name = t.id().split('.')[-1]
-        doc = t.shortDescription() or ""
-        desc = doc and ('%s: %s' % (name, doc)) or name
+        desc = self._generate_test_desc(t)
         
         # 所有测试用例都使用WITH_OUTPUT模板，即使没有输出也显示详情按钮
         tmpl = self.REPORT_TEST_WITH_OUTPUT_TMPL
@@ -1493,11 +3901,52 @@ class HTMLTestRunner(Template_mixin):
             script=script,
             status=self.STATUS[n],
             badge=badge,
+            wall=self._format_duration(stats['wall'] if stats else 0.0),
+            cpu=self._format_duration(stats['cpu'] if stats else 0.0),
+            output_link=self._generate_output_link(stats),
         )
         rows.append(row)
 
+    def _generate_class_name(self, cls):
+        if cls.__module__ == "__main__":
+            return cls.__name__
+        return "%s.%s" % (cls.__module__, cls.__name__)
+
+    def _generate_test_desc(self, t):
+        name = t.id().split('.')[-1]
+        doc = t.shortDescription() or ""
+        return doc and ('%s: %s' % (name, doc)) or name
+
+    def _output_href(self, stats):
+        """ Link to the spilled full output of a test """
+        path = stats and stats.get('output_file')
+        if not path:
+            return None
+        return self._relative_href(path)
+
+    def _relative_href(self, path):
+        """ Link to a file written next to the report, relative to the report if possible """
+        if hasattr(self.stream, 'name'):
+            path = os.path.relpath(path, os.path.dirname(os.path.abspath(self.stream.name)))
+        return path.replace(os.sep, '/')
+
+    def _generate_output_link(self, stats):
+        href = self._output_href(stats)
+        if not href:
+            return ''
+        return self.REPORT_OUTPUT_LINK_TMPL % dict(href=saxutils.escape(href, {'"': '&quot;'}))
+
     def _generate_ending(self):
-        return self.ENDING_TMPL
+        if self.report_mode == 'html':
+            return self.ENDING_TMPL
+        script = self.CLIENT_DATA_SCRIPT % dict(
+            status = self._dump_json([self.STATUS[n] for n in sorted(self.STATUS)]),
+        )
+        if self.report_mode == 'virtual':
+            script += self.VIRTUAL_SCROLL_SCRIPT
+        else:
+            script += self.CLIENT_RENDER_SCRIPT
+        return self.ENDING_TMPL + script
 
 
 ##############################################################################
@@ -1511,14 +3960,93 @@ class TestProgram(unittest.TestProgram):
     """
     A variation of the unittest.TestProgram. Please refer to the base
     class for command line parameters.
+
+    Additional parameters:
+      --output FILE                     write the report to FILE instead of
+                                        stdout
+      --shard-index I --shard-count N   run only shard I (0 based) of N
+      --shard-durations FILE            balance shards by the test times of
+                                        a previous run's JSONL results
+      --history FILE                    SQLite history store the run is
+                                        appended to
+      --profile                         run each test under cProfile and
+                                        list the hot functions in the report
+      --profile-slowest N               also write .prof files of the N
+                                        slowest tests (implies --profile)
+      --memory                          record the tracemalloc peak and RSS
+                                        growth of each test
+      --detect-leaks                    report tests leaving threads, fds or
+                                        child processes behind
+      --fail-on-leaks                   and fail them
+      --async-concurrency N             run async tests marked with
+                                        run_concurrently N at a time on a
+                                        shared event loop
     """
+    output = None
+    shard_index = None
+    shard_count = None
+    shard_durations = None
+    history = None
+    profile = False
+    profile_slowest = 0
+    memory = False
+    detect_leaks = False
+    fail_on_leaks = False
+    async_concurrency = 0
+
+    def _getParentArgParser(self):
+        parser = unittest.TestProgram._getParentArgParser(self)
+        parser.add_argument('--output', dest='output', metavar='FILE',
+                            help='Write the HTML report to this file instead of stdout')
+        parser.add_argument('--shard-index', dest='shard_index', type=int,
+                            help='Run only this shard of the suite (0 based)')
+        parser.add_argument('--shard-count', dest='shard_count', type=int,
+                            help='Number of shards the suite is split into')
+        parser.add_argument('--shard-durations', dest='shard_durations', metavar='FILE',
+                            help='JSONL results of a previous run used to balance the shards')
+        parser.add_argument('--history', dest='history', metavar='FILE',
+                            help='SQLite file recording per-test status and duration across runs')
+        parser.add_argument('--profile', dest='profile', action='store_true',
+                            help='Profile each test with cProfile and report the hot functions')
+        parser.add_argument('--profile-slowest', dest='profile_slowest', type=int, metavar='N',
+                            help='Write .prof files of the N slowest tests (implies --profile)')
+        parser.add_argument('--memory', dest='memory', action='store_true',
+                            help='Record the tracemalloc peak and RSS growth of each test')
+        parser.add_argument('--detect-leaks', dest='detect_leaks', action='store_true',
+                            help='Report tests that leave threads, file descriptors or child processes behind')
+        parser.add_argument('--fail-on-leaks', dest='fail_on_leaks', action='store_true',
+                            help='Fail tests that leave threads, file descriptors or child processes behind')
+        parser.add_argument('--async-concurrency', dest='async_concurrency', type=int, metavar='N',
+                            help='Run async tests marked with run_concurrently N at a time on one event loop')
+        return parser
+
     def runTests(self):
-        # Pick HTMLTestRunner as the default test runner.
-        # base class's testRunner parameter is not useful because it means
-        # we have to instantiate HTMLTestRunner before we know self.verbosity.
-        if self.testRunner is None:
-            self.testRunner = HTMLTestRunner(verbosity=self.verbosity)
-        unittest.TestProgram.runTests(self)
+        if self.shard_count:
+            if self.shard_index is None or not 0 <= self.shard_index < self.shard_count:
+                sys.exit('--shard-index must be between 0 and --shard-count - 1')
+            # not balanced by --history: each node appends its own shard to
+            # its history, so the nodes would compute different partitions
+            durations = None
+            if self.shard_durations:
+                durations = read_durations(self.shard_durations)
+            self.test = shard_suite(self.test, self.shard_index, self.shard_count, durations)
+        # the report is written as bytes
+        output = open(self.output, 'wb') if self.output and self.testRunner is None else None
+        try:
+            # Pick HTMLTestRunner as the default test runner.
+            # base class's testRunner parameter is not useful because it means
+            # we have to instantiate HTMLTestRunner before we know self.verbosity.
+            if self.testRunner is None:
+                self.testRunner = HTMLTestRunner(stream=output or getattr(sys.stdout, 'buffer', sys.stdout),
+                                                 verbosity=self.verbosity, history_file=self.history,
+                                                 profile=self.profile, profile_slowest=self.profile_slowest or 0,
+                                                 memory=self.memory, detect_leaks=self.detect_leaks,
+                                                 fail_on_leaks=self.fail_on_leaks,
+                                                 async_concurrency=self.async_concurrency or 0)
+            unittest.TestProgram.runTests(self)
+        finally:
+            if output is not None:
+                output.close()
 
 main = TestProgram
 
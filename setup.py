@@ -13,6 +13,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/Aquarius-0455/HTMLTestRunner-Lit",
     packages=find_packages(),
+    package_data={"htmltestrunner": ["static/*"]},
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Intended Audience :: Developers",